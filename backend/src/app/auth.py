@@ -1,62 +1,233 @@
+import dataclasses
+import time
 import uuid
+from typing import Any, Dict, Optional, Union
+
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
 
-from app.db import db_session
+from app.cache import get_user_cache
+from app.db import db_session, get_session
 from app.models import OrganizationDAO, UserDAO
+from app.passwords import hash_password_async, needs_rehash, verify_password_async
+from app.revocation import get_revocation_list
+from app.schemas import RefreshRequest
 from app.settings import get_settings
+from app.tokens import ALGORITHM, decode_token
 
 router = APIRouter(prefix="/auth")
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 SECRET_KEY = get_settings().SECRET_KEY
-ALGORITHM = "HS256"
+# Value of the "type" claim, refresh tokens are only accepted by /auth/refresh
+ACCESS_TOKEN = "access"
+REFRESH_TOKEN = "refresh"
+
+
+@dataclasses.dataclass(frozen=True)
+class TokenUser:
+    "The caller as described by JWT claims, used when AUTH_STATELESS is on"
+    id: uuid.UUID
+    name: str
+    organization_id: Optional[uuid.UUID]
 
 
 class RequestContext:
-    def __init__(self, user: UserDAO, org: OrganizationDAO) -> None:
+    """
+    Who is making the request.  `user` is a UserDAO, or a TokenUser when the
+    context was built from JWT claims alone (in which case `org` is None).
+    Use the get_user dependency when a handler needs the full UserDAO.
+    """
+
+    def __init__(
+        self, user: Union[UserDAO, TokenUser], org: Optional[OrganizationDAO]
+    ) -> None:
         self.user = user
         self.org = org
 
 
 @router.post("/login", include_in_schema=False)
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
-    "Authenticate a user and return a JWT token used for further requests"
+    "Authenticate a user and return access and refresh tokens"
     async with db_session() as session:
         db_user = await UserDAO.get_user_by_name(session, form_data.username)
     if not db_user:
         raise HTTPException(status.HTTP_401_UNAUTHORIZED, detail="User not found")
-    if not db_user.password == form_data.password:
+    # Hashing runs in an executor, with no database connection checked out
+    if not await verify_password_async(form_data.password, db_user.password):
         raise HTTPException(status.HTTP_403_FORBIDDEN, detail="Incorrect password")
+    if needs_rehash(db_user.password, get_settings().PASSWORD_HASH_N):
+        # Legacy plaintext (or outdated hash parameters), store a fresh hash
+        password = await hash_password_async(form_data.password)
+        async with db_session() as session:
+            await UserDAO.bulk_update(
+                session, [{"id": db_user.id, "password": password}]
+            )
+    return token_response(db_user)
+
+
+@router.post("/refresh")
+async def refresh(form_data: RefreshRequest):
+    """
+    Exchange a refresh token for a new access token.  Refresh tokens are
+    single use, the response includes a new one.
+    """
+    claims = verify_token(form_data.refresh_token, REFRESH_TOKEN)
+    async with db_session() as session:
+        db_user = await UserDAO.get(session, uuid.UUID(claims["user_id"]))
+        if db_user is None:
+            raise credentials_exception()
+        get_revocation_list().revoke(session, claims)
+    return token_response(db_user)
+
+
+@router.post("/logout")
+async def logout(
+    form_data: Optional[RefreshRequest] = None, token: str = Depends(oauth2_scheme)
+):
+    "Revoke the access token, and the refresh token if one is sent"
+    tokens = [verify_token(token, ACCESS_TOKEN)]
+    if form_data is not None:
+        tokens.append(verify_token(form_data.refresh_token, REFRESH_TOKEN))
+    async with db_session() as session:
+        for claims in tokens:
+            get_revocation_list().revoke(session, claims)
+    return {}
+
+
+async def delete_user(session: AsyncSession, user_id: uuid.UUID) -> bool:
+    """
+    Delete a user and revoke every token issued to them, returning whether
+    the user existed.  Nothing is revoked for a missing user.
+    """
+    if not await UserDAO.delete(session, user_id):
+        return False
+    get_revocation_list().revoke_user(session, user_id)
+    return True
+
+
+def token_response(user: UserDAO) -> Dict[str, Any]:
     # delegate token creation partly to make testing easier
-    jwt_token = create_token(db_user.id)
-    return {"access_token": jwt_token, "token_type": "bearer"}
+    access_token = create_token(
+        user.id, name=user.name, organization_id=user.organization_id
+    )
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "expires_in": get_settings().ACCESS_TOKEN_TTL,
+        "refresh_token": create_token(user.id, token_type=REFRESH_TOKEN),
+    }
 
 
-def create_token(user_id: uuid.UUID):
-    "Create a JWT token for the given user_id"
-    return jwt.encode({"user_id": str(user_id)}, SECRET_KEY, algorithm=ALGORITHM)
+def create_token(
+    user_id: uuid.UUID,
+    name: Optional[str] = None,
+    organization_id: Optional[uuid.UUID] = None,
+    token_type: str = ACCESS_TOKEN,
+):
+    """
+    Create a JWT token for the given user_id, expiring after ACCESS_TOKEN_TTL
+    (or REFRESH_TOKEN_TTL for refresh tokens).  Including the name and
+    organization_id claims lets get_rctx skip the database in AUTH_STATELESS mode.
+    """
+    settings = get_settings()
+    ttl = (
+        settings.REFRESH_TOKEN_TTL
+        if token_type == REFRESH_TOKEN
+        else settings.ACCESS_TOKEN_TTL
+    )
+    now = int(time.time())
+    claims = {
+        "user_id": str(user_id),
+        "type": token_type,
+        "jti": uuid.uuid4().hex,
+        "iat": now,
+        "exp": now + ttl,
+    }
+    if name is not None:
+        claims["name"] = name
+        claims["org_id"] = str(organization_id) if organization_id else None
+    return jwt.encode(claims, SECRET_KEY, algorithm=ALGORITHM)
 
 
-async def get_rctx(token: str = Depends(oauth2_scheme)) -> RequestContext:
-    "Return the user for the given JWT token"
-    credentials_exception = HTTPException(
+def credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+
+def verify_token(token: str, token_type: str) -> Dict[str, Any]:
+    """
+    Return the claims of a valid, unexpired, unrevoked token of the given
+    type, or raise a 401.  Tokens without an exp are rejected.
+    """
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("user_id")
-        if user_id is None:
-            raise credentials_exception
+        claims = decode_token(token)
     except JWTError:
-        raise credentials_exception
-    async with db_session() as session:
-        user = await UserDAO.get(session, user_id)
-        org = user.organization
-        if user is None:
-            raise credentials_exception
+        raise credentials_exception()
+    if (
+        claims.get("type", ACCESS_TOKEN) != token_type
+        or "exp" not in claims
+        or "user_id" not in claims
+        or get_revocation_list().is_revoked(claims)
+    ):
+        raise credentials_exception()
+    return claims
+
+
+async def get_rctx(
+    token: str = Depends(oauth2_scheme),
+    session: AsyncSession = Depends(get_session),
+) -> RequestContext:
+    "Return the user for the given JWT token"
+    payload = verify_token(token, ACCESS_TOKEN)
+    try:
+        user_id = uuid.UUID(payload["user_id"])
+    except (TypeError, ValueError):
+        raise credentials_exception()
+
+    # Tokens issued before the name/org_id claims existed fall through to the db
+    if get_settings().AUTH_STATELESS and "name" in payload:
+        org_id = payload.get("org_id")
+        user = TokenUser(
+            id=user_id,
+            name=payload["name"],
+            organization_id=uuid.UUID(org_id) if org_id else None,
+        )
+        return RequestContext(user=user, org=None)
+
+    user = await UserDAO.get(
+        session, user_id, options=[joinedload(UserDAO.organization)]
+    )
+    if user is None:
+        raise credentials_exception()
+    org = user.organization
     return RequestContext(user=user, org=org)
+
+
+async def get_user(
+    rctx: RequestContext = Depends(get_rctx),
+    session: AsyncSession = Depends(get_session),
+) -> UserDAO:
+    """
+    Return the full UserDAO for the request, from the in-process user cache
+    when possible.  Only needed when get_rctx was resolved from JWT claims.
+    """
+    if isinstance(rctx.user, UserDAO):
+        return rctx.user
+    cache = get_user_cache()
+    user = cache.get(rctx.user.id)
+    if user is None:
+        user = await UserDAO.get(session, rctx.user.id)
+        if user is None:
+            raise credentials_exception()
+        # Detach so cached objects are never tied to one request's session
+        session.expunge(user)
+        cache.set(user.id, user)
+    return user
@@ -0,0 +1,145 @@
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.metrics import REGISTRY, CallbackGauge
+from app.settings import get_settings
+
+# Invalidation channels, see app.invalidation for what each one evicts
+USER_CHANNEL = "user"
+TODO_LIST_CHANNEL = "todo_list"
+# session.info key holding the (channel, key) pairs to invalidate on commit
+PENDING_INVALIDATIONS = "pending_invalidations"
+
+
+class TTLCache:
+    """
+    Bounded in-process LRU cache whose entries also expire after `ttl` seconds.
+
+    Not shared between processes, so anything cached here must be invalidated
+    explicitly (e.g. UserDAO.update / UserDAO.delete) when it changes, see
+    invalidate_on_commit.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        "Return the cached value for key, or None if it's missing or expired"
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> None:
+        "Drop every entry whose key matches predicate"
+        for key in [key for key in self._data if predicate(key)]:
+            del self._data[key]
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._data)}
+
+
+def invalidate_on_commit(session, channel: str, key: Hashable) -> None:
+    """
+    Evict key from the caches subscribed to channel, in every backend process,
+    once session (an AsyncSession or Session) commits.  Nothing is evicted if
+    it rolls back.
+    """
+    if not isinstance(session, Session):
+        session = session.sync_session
+    session.info.setdefault(PENDING_INVALIDATIONS, set()).add((channel, str(key)))
+
+
+@lru_cache
+def get_user_cache() -> TTLCache:
+    "Process-wide cache of UserDAO objects keyed by user id"
+    settings = get_settings()
+    return TTLCache(maxsize=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL)
+
+
+@lru_cache
+def get_token_cache() -> TTLCache:
+    "Process-wide cache of verified JWT claims keyed by token, see app.tokens"
+    settings = get_settings()
+    return TTLCache(maxsize=settings.JWT_CACHE_SIZE, ttl=settings.JWT_CACHE_TTL)
+
+
+@lru_cache
+def get_response_cache() -> TTLCache:
+    """
+    Process-wide cache of serialized responses, keyed by (user id, request
+    URL, ETag) so that a lookup only hits when the data is unchanged.
+    """
+    settings = get_settings()
+    return TTLCache(
+        maxsize=settings.RESPONSE_CACHE_SIZE, ttl=settings.RESPONSE_CACHE_TTL
+    )
+
+
+REGISTRY.register(
+    CallbackGauge(
+        "user_cache_requests_total",
+        "User cache lookups, by result",
+        lambda: {
+            ("hit",): get_user_cache().hits,
+            ("miss",): get_user_cache().misses,
+        },
+        labels=("result",),
+        type="counter",
+    )
+)
+REGISTRY.register(
+    CallbackGauge(
+        "response_cache_requests_total",
+        "Response cache lookups, by result",
+        lambda: {
+            ("hit",): get_response_cache().hits,
+            ("miss",): get_response_cache().misses,
+        },
+        labels=("result",),
+        type="counter",
+    )
+)
+REGISTRY.register(
+    CallbackGauge(
+        "token_cache_requests_total",
+        "Verified JWT cache lookups, by result",
+        lambda: {
+            ("hit",): get_token_cache().hits,
+            ("miss",): get_token_cache().misses,
+        },
+        labels=("result",),
+        type="counter",
+    )
+)
@@ -1,39 +1,250 @@
+import base64
+import hashlib
+import json
 import uuid
-from typing import List
+from datetime import datetime
+from typing import List, Optional, Sequence, Tuple, Union
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.auth import RequestContext, get_rctx
-from app.db import db_session
+from app.cache import TODO_LIST_CHANNEL, get_response_cache, invalidate_on_commit
+from app.db import SessionRoute, get_session
 from app.models import TodoDAO
-from app.schemas import TodoCreate, TodoOut, TodoUpdate
+from app.schemas import (
+    TodoBulkCreateList,
+    TodoBulkDeleteList,
+    TodoBulkResult,
+    TodoBulkUpdateList,
+    TodoCreate,
+    TodoOut,
+    TodoUpdate,
+)
+from app.serializers import FastJSONResponse, RowEncoder
+from app.settings import get_settings
 
-router = APIRouter(prefix="/todo", tags=["todo"])
+router = APIRouter(prefix="/todo", tags=["todo"], route_class=SessionRoute)
+
+MAX_PAGE_SIZE = 1000
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+# Clients may keep responses, but have to revalidate them with If-None-Match
+CACHE_CONTROL = "private, no-cache"
+# Core row -> TodoOut JSON, for FAST_SERIALIZER
+TODO_ENCODER = RowEncoder(TodoOut)
+
+
+def encode_cursor(todo: Union[TodoDAO, Row]) -> str:
+    "Opaque pagination cursor pointing just past the given todo"
+    key = [todo.created_at.isoformat(), str(todo.id)]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    try:
+        created_at, id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), uuid.UUID(id)
+    except (TypeError, ValueError):
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def todo_etag(todo: Union[TodoDAO, Row]) -> str:
+    "Strong ETag for one todo, changes whenever the row is updated"
+    return f'"{todo.id.hex}-{todo.updated_at.timestamp():.6f}"'
+
+
+def todo_list_etag(todos: Sequence[Row], has_next: bool) -> str:
+    """
+    Strong ETag for a list page, from the id and updated_at of each todo on it
+    and whether there is a next page, which is all the response depends on
+    """
+    key = [(todo.id.hex, todo.updated_at.isoformat()) for todo in todos]
+    digest = hashlib.sha1(repr((key, has_next)).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def if_none_match(request: Request, etag: str) -> bool:
+    "Whether the request's If-None-Match header matches etag"
+    header = request.headers.get("if-none-match")
+    if header is None:
+        return False
+    # If-None-Match uses the weak comparison, W/"x" matches "x"
+    tags = [tag.strip() for tag in header.split(",")]
+    tags = [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+    return "*" in tags or etag in tags
+
+
+def not_modified(etag: str) -> Response:
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED,
+        headers={"ETag": etag, "Cache-Control": CACHE_CONTROL},
+    )
+
+
+def invalidate_responses(session: AsyncSession, user_id: uuid.UUID):
+    """
+    Drop a user's cached responses, in every process, once session commits.
+    Entries are keyed by ETag so they could never be served stale anyway,
+    this just frees the memory.
+    """
+    invalidate_on_commit(session, TODO_LIST_CHANNEL, user_id)
 
 
 @router.post("/", response_model=TodoOut)
-async def create_todo(form_data: TodoCreate, rctx: RequestContext = Depends(get_rctx)):
-    async with db_session() as session:
-        data = {}
-        data.update(form_data)
-        data["user"] = rctx.user
-        new_todo = await TodoDAO.create(session, data)
+async def create_todo(
+    form_data: TodoCreate,
+    rctx: RequestContext = Depends(get_rctx),
+    session: AsyncSession = Depends(get_session),
+):
+    data = {}
+    data.update(form_data)
+    data["user_id"] = rctx.user.id
+    new_todo = await TodoDAO.create(session, data)
+    invalidate_responses(session, rctx.user.id)
     return new_todo
 
 
 @router.get("/", response_model=List[TodoOut])
-async def get_all_todos(rctx: RequestContext = Depends(get_rctx)):
-    async with db_session() as session:
-        todos = await TodoDAO.get_todos_by_username(session, rctx.user.name)
+async def get_all_todos(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    stream: bool = False,
+    rctx: RequestContext = Depends(get_rctx),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    List the user's todos, newest first.
+
+    Results are paginated by `limit` (default TODO_PAGE_SIZE).  When there are
+    more todos the response has an `X-Next-Cursor` header, pass its value back
+    as `cursor` to get the next page.  With `stream=true` the todos after
+    `cursor` (all of them unless `limit` is given) are streamed as
+    newline-delimited JSON instead.
+
+    Pages carry an ETag.  A request whose If-None-Match matches it gets a 304
+    without the page being serialized.
+    """
+    settings = get_settings()
+    after = decode_cursor(cursor) if cursor else None
+    if stream:
+        rows = TodoDAO.stream_todo_rows(
+            session, rctx.user.id, TodoOut, after=after, limit=limit
+        )
+
+        async def ndjson():
+            async for row in rows:
+                if settings.FAST_SERIALIZER:
+                    yield TODO_ENCODER.encode_one(row) + b"\n"
+                else:
+                    yield TodoOut.from_orm(row).json() + "\n"
+
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    limit = limit or settings.TODO_PAGE_SIZE
+    # Fetch one extra row to find out whether there is a next page
+    todos = await TodoDAO.get_todo_rows_page(
+        session, rctx.user.id, TodoOut, limit=limit + 1, after=after
+    )
+    has_next = len(todos) > limit
+    todos = todos[:limit]
+    etag = todo_list_etag(todos, has_next)
+    if if_none_match(request, etag):
+        return not_modified(etag)
+
+    cache_key = (rctx.user.id, str(request.url), etag)
+    use_cache = settings.RESPONSE_CACHE_SIZE > 0
+    if use_cache:
+        cached = get_response_cache().get(cache_key)
+        if cached is not None:
+            body, headers = cached
+            return Response(body, media_type="application/json", headers=headers)
+
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if has_next:
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(todos[-1])
+    # Serialized here rather than through response_model, to cache the body
+    if settings.FAST_SERIALIZER:
+        content = [TODO_ENCODER.to_dict(row) for row in todos]
+        response = FastJSONResponse(content, headers=headers)
+    else:
+        content = jsonable_encoder([TodoOut.from_orm(todo) for todo in todos])
+        response = JSONResponse(content, headers=headers)
+    if use_cache:
+        get_response_cache().set(cache_key, (response.body, headers))
+    return response
+
+
+# Bulk routes have to be registered before the /{id} routes, or "bulk" is
+# matched (and rejected) as an id.
+@router.post("/bulk", response_model=List[TodoOut])
+async def bulk_create_todos(
+    form_data: TodoBulkCreateList,
+    rctx: RequestContext = Depends(get_rctx),
+    session: AsyncSession = Depends(get_session),
+):
+    "Create many todos at once, returned in the same order they were sent"
+    data = [{**item.dict(), "user_id": rctx.user.id} for item in form_data]
+    todos = await TodoDAO.bulk_create(session, data)
+    invalidate_responses(session, rctx.user.id)
     return todos
 
 
+@router.patch("/bulk", response_model=List[TodoBulkResult])
+async def bulk_update_todos(
+    form_data: TodoBulkUpdateList,
+    rctx: RequestContext = Depends(get_rctx),
+    session: AsyncSession = Depends(get_session),
+):
+    "Update many todos at once, with a result per item (404 for missing ids)"
+    # Other users' todos are left alone and reported as missing
+    owned = TodoDAO.user_id == rctx.user.id
+    updated = await TodoDAO.bulk_update(session, form_data, where=owned)
+    invalidate_responses(session, rctx.user.id)
+    results = []
+    for item in form_data:
+        todo = updated.get(item.id)
+        status_code = status.HTTP_200_OK if todo else status.HTTP_404_NOT_FOUND
+        results.append({"id": item.id, "status": status_code, "todo": todo})
+    return results
+
+
+@router.delete("/bulk", response_model=List[TodoBulkResult])
+async def bulk_delete_todos(
+    form_data: TodoBulkDeleteList,
+    rctx: RequestContext = Depends(get_rctx),
+    session: AsyncSession = Depends(get_session),
+):
+    "Delete many todos at once, with a result per id (404 for missing ids)"
+    owned = TodoDAO.user_id == rctx.user.id
+    deleted = set(await TodoDAO.bulk_delete(session, form_data, where=owned))
+    invalidate_responses(session, rctx.user.id)
+    results = []
+    for id in form_data:
+        status_code = status.HTTP_200_OK if id in deleted else status.HTTP_404_NOT_FOUND
+        results.append({"id": id, "status": status_code})
+    return results
+
+
 @router.get("/{id}", response_model=TodoOut)
-async def get_todo(id: uuid.UUID, rctx: RequestContext = Depends(get_rctx)):
-    async with db_session() as session:
-        todo = await TodoDAO.get(session, id)
+async def get_todo(
+    id: uuid.UUID,
+    request: Request,
+    response: Response,
+    rctx: RequestContext = Depends(get_rctx),
+    session: AsyncSession = Depends(get_session),
+):
+    todo = await TodoDAO.get_row(session, id, TodoOut, "updated_at")
     if not todo:
         raise HTTPException(status.HTTP_404_NOT_FOUND, detail=f"Todo not found")
+    etag = todo_etag(todo)
+    if if_none_match(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
     return todo
 
 
@@ -42,19 +253,24 @@ async def update_todo(
     id: uuid.UUID,
     form_data: TodoUpdate,
     rctx: RequestContext = Depends(get_rctx),
+    session: AsyncSession = Depends(get_session),
 ):
-    async with db_session() as session:
-        todo = await TodoDAO.get(session, id)
-        if not todo:
-            raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Todo not found")
-        todo.update(form_data)
+    todo = await TodoDAO.get(session, id)
+    if not todo:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Todo not found")
+    todo.update(form_data)
+    invalidate_responses(session, todo.user_id)
     return todo
 
 
 @router.delete("/{id}")
-async def delete_todo(id: uuid.UUID, rctx: RequestContext = Depends(get_rctx)):
-    async with db_session() as session:
-        rowcount = await TodoDAO.delete(session, id)
-        if rowcount == 0:
-            raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Todo not found")
+async def delete_todo(
+    id: uuid.UUID,
+    rctx: RequestContext = Depends(get_rctx),
+    session: AsyncSession = Depends(get_session),
+):
+    rowcount = await TodoDAO.delete(session, id)
+    if rowcount == 0:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Todo not found")
+    invalidate_responses(session, rctx.user.id)
     return {}
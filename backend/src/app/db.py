@@ -1,21 +1,318 @@
+import asyncio
+import random
+from collections import Counter
 from contextlib import asynccontextmanager
+from typing import (
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Coroutine,
+    Dict,
+    Optional,
+    Tuple,
+    TypeVar,
+)
 
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.orm import sessionmaker
+import structlog
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
 
+from app.metrics import (
+    REGISTRY,
+    CallbackGauge,
+    TimedAsyncAdaptedQueuePool,
+    instrument_engine,
+)
 from app.settings import get_settings
+from app.slow_queries import current_route, slow_query_log
+
+# One engine (and connection pool) per process.  These are created lazily
+# instead of at import time so that importing app.db doesn't trigger
+# get_settings(), which lets tests override settings before first use.
+_engine: Optional[AsyncEngine] = None
+_sessionmaker: Optional[sessionmaker] = None
+# Engine and sessionmaker for read-only requests.  Unless DB_READ_DSN or
+# DB_FOLLOWER_READS is set, these are the same objects as the primary ones.
+_read_engine: Optional[AsyncEngine] = None
+_read_sessionmaker: Optional[sessionmaker] = None
+
+# Requests using these methods never write, so their session is not committed
+READ_ONLY_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+# CockroachDB asks clients to retry transactions that lost a serialization
+# conflict (RETRY_SERIALIZABLE, RETRY_WRITE_TOO_OLD, ...) with this SQLSTATE
+SERIALIZATION_FAILURE = "40001"
+
+# Number of transaction retries, keyed by route path (or "run_transaction")
+retry_counts: Counter = Counter()
+
+logger = structlog.get_logger(__name__)
+
+T = TypeVar("T")
+
+
+class FollowerReadSession(Session):
+    """
+    Session whose transactions read from CockroachDB follower replicas, as of
+    follower_read_timestamp() (a few seconds in the past).  Any node holding
+    a replica can serve these reads instead of only the leaseholder.
+    """
+
+
+@event.listens_for(FollowerReadSession, "after_begin")
+def _set_follower_read(session, transaction, connection):
+    # Has to be the first statement in the transaction
+    connection.exec_driver_sql(
+        "SET TRANSACTION AS OF SYSTEM TIME follower_read_timestamp()"
+    )
+
+
+def _create_engine(dsn: str) -> AsyncEngine:
+    settings = get_settings()
+    engine = create_async_engine(
+        dsn,
+        poolclass=TimedAsyncAdaptedQueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args={
+            "prepared_statement_cache_size": settings.DB_PREPARED_STATEMENT_CACHE_SIZE
+        },
+    )
+    instrument_engine(engine.sync_engine)
+    if settings.SLOW_QUERY_THRESHOLD_MS is not None:
+        slow_query_log.configure(
+            threshold_ms=settings.SLOW_QUERY_THRESHOLD_MS,
+            maxlen=settings.SLOW_QUERY_LOG_SIZE,
+            explain=settings.SLOW_QUERY_EXPLAIN,
+        )
+        slow_query_log.attach(engine)
+    return engine
+
+
+def init_engine() -> AsyncEngine:
+    "Create the process-wide engines and sessionmakers, if they don't exist yet"
+    global _engine, _sessionmaker, _read_engine, _read_sessionmaker
+    if _engine is None:
+        settings = get_settings()
+        _engine = _create_engine(settings.DB_DSN)
+        _sessionmaker = sessionmaker(
+            _engine, class_=AsyncSession, expire_on_commit=False
+        )
+        if settings.DB_READ_DSN or settings.DB_FOLLOWER_READS:
+            if settings.DB_READ_DSN:
+                _read_engine = _create_engine(settings.DB_READ_DSN)
+            else:
+                _read_engine = _engine
+            _read_sessionmaker = sessionmaker(
+                _read_engine,
+                class_=AsyncSession,
+                sync_session_class=(
+                    FollowerReadSession if settings.DB_FOLLOWER_READS else Session
+                ),
+                expire_on_commit=False,
+            )
+        else:
+            _read_engine = _engine
+            _read_sessionmaker = _sessionmaker
+    return _engine
+
+
+async def dispose_engine():
+    "Close all pooled connections and drop the process-wide engines"
+    global _engine, _sessionmaker, _read_engine, _read_sessionmaker
+    if _read_engine is not None and _read_engine is not _engine:
+        await _read_engine.dispose()
+    if _engine is not None:
+        await _engine.dispose()
+    _engine = None
+    _sessionmaker = None
+    _read_engine = None
+    _read_sessionmaker = None
+
+
+def get_engine() -> AsyncEngine:
+    "Return the process-wide engine, creating it on first use"
+    return init_engine()
 
 
 @asynccontextmanager
-async def db_session():
-    # Putting engine creation and sessionmaker in here
-    # so that importing app.db doesn't trigger get_settings().
-    # TODO: determine best syntax to use for engine/sessionmaker
-    engine = create_async_engine(get_settings().DB_DSN)
-    async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
-    session = async_session()
+async def db_session(read_only: bool = False):
+    """
+    Yield an AsyncSession that is committed on exit.  `read_only` sessions
+    use the read engine / follower reads when those are configured, so they
+    may not see the most recent writes.
+    """
+    init_engine()
+    session = _read_sessionmaker() if read_only else _sessionmaker()
     try:
         yield session
         await session.commit()
     finally:
         await session.close()
+
+
+def _pool_stat(stat: str) -> Callable[[], Dict[Tuple[str, ...], float]]:
+    "Scrape-time reader of a connection pool statistic for each engine"
+
+    def read():
+        engines = {"primary": _engine}
+        if _read_engine is not _engine:
+            engines["read"] = _read_engine
+        return {
+            (name,): getattr(engine.sync_engine.pool, stat)()
+            for name, engine in engines.items()
+            if engine is not None
+        }
+
+    return read
+
+
+REGISTRY.register(
+    CallbackGauge(
+        "db_pool_size",
+        "Configured number of persistent connections in the pool",
+        _pool_stat("size"),
+        labels=("engine",),
+    )
+)
+REGISTRY.register(
+    CallbackGauge(
+        "db_pool_checked_out",
+        "Connections currently checked out of the pool",
+        _pool_stat("checkedout"),
+        labels=("engine",),
+    )
+)
+REGISTRY.register(
+    CallbackGauge(
+        "db_pool_overflow",
+        "Connections open beyond pool_size (negative while the pool is filling)",
+        _pool_stat("overflow"),
+        labels=("engine",),
+    )
+)
+REGISTRY.register(
+    CallbackGauge(
+        "db_transaction_retries_total",
+        "Transactions re-run after a serialization failure",
+        lambda: {(name,): count for name, count in retry_counts.items()},
+        labels=("name",),
+        type="counter",
+    )
+)
+
+
+def is_retryable(exc: BaseException) -> bool:
+    "Whether exc is a serialization failure that can be fixed by retrying"
+    return (
+        isinstance(exc, DBAPIError)
+        and getattr(exc.orig, "pgcode", None) == SERIALIZATION_FAILURE
+    )
+
+
+def retry_delay(attempt: int) -> float:
+    "Exponential backoff with full jitter, capped at DB_RETRY_MAX_DELAY"
+    settings = get_settings()
+    ceiling = settings.DB_RETRY_BASE_DELAY * 2**attempt
+    return random.uniform(0, min(settings.DB_RETRY_MAX_DELAY, ceiling))
+
+
+async def _before_retry(exc: DBAPIError, attempt: int, name: str):
+    "Raise exc if it can't be retried, otherwise record the retry and back off"
+    if not is_retryable(exc) or attempt >= get_settings().DB_RETRY_MAX_ATTEMPTS:
+        raise exc
+    delay = retry_delay(attempt)
+    retry_counts[name] += 1
+    logger.warning(
+        "Retrying transaction after serialization failure",
+        name=name,
+        attempt=attempt,
+        delay=delay,
+    )
+    await asyncio.sleep(delay)
+
+
+async def run_transaction(
+    callback: Callable[[AsyncSession], Awaitable[T]], read_only: bool = False
+) -> T:
+    """
+    Run `await callback(session)` in a db_session() transaction, re-running
+    the whole callback on serialization failures.  The callback may be called
+    several times so it shouldn't have side effects outside the database.
+    """
+    attempt = 0
+    while True:
+        try:
+            async with db_session(read_only=read_only) as session:
+                return await callback(session)
+        except DBAPIError as exc:
+            attempt += 1
+            await _before_retry(exc, attempt, "run_transaction")
+
+
+async def get_session(request: Request) -> AsyncIterator[AsyncSession]:
+    """
+    FastAPI dependency yielding one AsyncSession per request.
+
+    FastAPI caches dependencies per request, so get_rctx and the endpoint
+    share this session (and its connection / transaction).  Committing is
+    handled by SessionRoute, the session is closed (rolling back anything
+    uncommitted) when the request is finished.
+
+    Read-only requests (GET etc.) get a session from the read engine, see
+    DB_READ_DSN and DB_FOLLOWER_READS.  Everything else, including handlers
+    that read then write, stays on the primary.
+    """
+    init_engine()
+    current_route.set(f"{request.method} {request.url.path}")
+    if request.method in READ_ONLY_METHODS:
+        session = _read_sessionmaker()
+    else:
+        session = _sessionmaker()
+    request.state.db_session = session
+    try:
+        yield session
+    finally:
+        await session.close()
+
+
+class SessionRoute(APIRoute):
+    """
+    Route class that commits the request-scoped session from get_session
+    once the endpoint has returned, but before the response is sent.
+
+    Dependency teardown (the code after `yield` in get_session) runs after the
+    response has already gone out, which is too late to report a failed commit
+    or guarantee read-your-writes for the client's next request.
+
+    Serialization failures from the endpoint or the commit re-run the whole
+    handler (dependencies included, so with a fresh session) with backoff,
+    rather than surfacing as a 500 that the client / load-balancer retries.
+    """
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[None, None, Response]]:
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            attempt = 0
+            while True:
+                try:
+                    response = await handler(request)
+                    session = getattr(request.state, "db_session", None)
+                    if session is not None and request.method not in READ_ONLY_METHODS:
+                        await session.commit()
+                    return response
+                except DBAPIError as exc:
+                    attempt += 1
+                    session = getattr(request.state, "db_session", None)
+                    if session is not None:
+                        await session.close()
+                    await _before_retry(exc, attempt, self.path)
+
+        return route_handler
@@ -1,17 +1,28 @@
 import os
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, status
 
-from app.auth import RequestContext, get_rctx
+from app.auth import RequestContext, delete_user, get_rctx, get_user
+from app.db import db_session
 from app.models import UserDAO
 from app.schemas import UserOut
+from app.settings import get_settings
+from app.slow_queries import slow_query_log
 
 router = APIRouter()
 
 
 @router.get("/me", response_model=UserOut)
-def me(rctx: RequestContext = Depends(get_rctx)):
-    return rctx.user
+def me(user: UserDAO = Depends(get_user)):
+    return user
+
+
+@router.delete("/me")
+async def delete_me(rctx: RequestContext = Depends(get_rctx)):
+    "Delete the caller's account, revoking every token issued to it"
+    async with db_session() as session:
+        await delete_user(session, rctx.user.id)
+    return {}
 
 
 # Useful for seeing which backend your browser is connected to
@@ -19,3 +30,17 @@ def me(rctx: RequestContext = Depends(get_rctx)):
 @router.get("/host")
 def environ():
     return os.environ.get("HOSTNAME")
+
+
+def debug_routes_enabled():
+    "404 unless DEBUG_ROUTES is on"
+    if not get_settings().DEBUG_ROUTES:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Not Found")
+
+
+# Most recent statements slower than SLOW_QUERY_THRESHOLD_MS in this
+# backend process, see app.slow_queries.  async so that the log is read on
+# the event loop, where it's appended to, not in the threadpool.
+@router.get("/debug/slow-queries", dependencies=[Depends(debug_routes_enabled)])
+async def slow_queries(rctx: RequestContext = Depends(get_rctx)):
+    return slow_query_log.recent()
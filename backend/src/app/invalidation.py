@@ -0,0 +1,198 @@
+"""
+Cross-process cache invalidation.
+
+Writers don't evict cache entries themselves.  They call
+app.cache.invalidate_on_commit(session, channel, key), and the session
+events below take it from there.  When the session commits, the keys are
+evicted from this process's caches, and the bus publishes them so that other
+processes (backend1 and backend2 behind Traefik, or uvicorn workers) evict
+them too.  Nothing happens if the transaction rolls back.
+
+Buses are pluggable: set INVALIDATION_BUS to pick one.
+ - "local": InvalidationBus, which doesn't publish anything.  This is fine
+   for a single process.
+ - "table": TableInvalidationBus, a LISTEN/NOTIFY stand-in over the
+   invalidation_events table.  Events are inserted in the same transaction
+   as the write they describe, and every process polls for new ones.
+"""
+
+import asyncio
+import contextlib
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import sqlalchemy as sa
+import structlog
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.cache import (
+    PENDING_INVALIDATIONS,
+    TODO_LIST_CHANNEL,
+    USER_CHANNEL,
+    get_response_cache,
+    get_user_cache,
+)
+from app.db import db_session
+from app.models import InvalidationEventDAO
+from app.settings import get_settings
+
+logger = structlog.get_logger(__name__)
+
+Handler = Callable[[str], None]
+Events = Set[Tuple[str, str]]
+
+# Re-read events this far behind the newest one seen, so that a transaction
+# that started (and got its created_at) before others but committed after
+# them is still picked up.  Re-delivered events are skipped.
+LOOKBACK = timedelta(seconds=10)
+# Delete events older than RETENTION, at most every PRUNE_INTERVAL seconds
+RETENTION = timedelta(minutes=10)
+PRUNE_INTERVAL = 60.0
+
+
+class InvalidationBus:
+    "Delivers invalidations to this process's caches, subclasses share them"
+
+    def __init__(self) -> None:
+        self._handlers: Dict[str, List[Handler]] = defaultdict(list)
+
+    def subscribe(self, channel: str, handler: Handler) -> None:
+        "Call handler(key) for every invalidation published on channel"
+        self._handlers[channel].append(handler)
+
+    def dispatch(self, channel: str, key: str) -> None:
+        for handler in self._handlers[channel]:
+            try:
+                handler(key)
+            except Exception:
+                logger.exception("Invalidation handler failed", channel=channel)
+
+    def publish(self, session: Session, events: Events) -> None:
+        "Share events with other processes, called just before session commits"
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+
+class TableInvalidationBus(InvalidationBus):
+    """
+    LISTEN/NOTIFY emulation over the invalidation_events table.  publish()
+    adds the events to the committing transaction, and a background task in
+    every process polls for new rows every `poll_interval` seconds.
+    """
+
+    def __init__(self, poll_interval: float = 1.0) -> None:
+        super().__init__()
+        self.poll_interval = poll_interval
+        self._task: Optional[asyncio.Task] = None
+        # created_at of the newest event seen, and ids of events seen since
+        # LOOKBACK before it
+        self._high_water: Optional[datetime] = None
+        self._seen: Dict[uuid.UUID, datetime] = {}
+        self._last_prune = 0.0
+
+    def publish(self, session: Session, events: Events) -> None:
+        session.add_all(
+            InvalidationEventDAO(channel=channel, key=key) for channel, key in events
+        )
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.poll()
+                if time.monotonic() - self._last_prune > PRUNE_INTERVAL:
+                    await self.prune()
+            except Exception:
+                logger.exception("Polling invalidation events failed")
+            await asyncio.sleep(self.poll_interval)
+
+    async def poll(self) -> int:
+        "Dispatch events committed since the last poll, returning how many"
+        async with db_session() as session:
+            if self._high_water is None:
+                # Caches start out empty, only events from now on matter
+                results = await session.execute(sa.select(sa.func.now()))
+                self._high_water = results.scalar_one()
+            since = self._high_water - LOOKBACK
+            rows = await InvalidationEventDAO.get_since(session, since)
+
+        dispatched = 0
+        for row in rows:
+            if row.id in self._seen:
+                continue
+            self._seen[row.id] = row.created_at
+            self._high_water = max(self._high_water, row.created_at)
+            self.dispatch(row.channel, row.key)
+            dispatched += 1
+        since = self._high_water - LOOKBACK
+        self._seen = {id: at for id, at in self._seen.items() if at > since}
+        return dispatched
+
+    async def prune(self) -> None:
+        "Delete events every process has had plenty of time to see"
+        self._last_prune = time.monotonic()
+        async with db_session() as session:
+            results = await session.execute(sa.select(sa.func.now()))
+            before = results.scalar_one() - RETENTION
+            await InvalidationEventDAO.delete_before(session, before)
+
+
+@lru_cache
+def get_invalidation_bus() -> InvalidationBus:
+    "Process-wide invalidation bus, subscribed to the app's caches"
+    settings = get_settings()
+    if settings.INVALIDATION_BUS == "table":
+        bus = TableInvalidationBus(poll_interval=settings.INVALIDATION_POLL_INTERVAL)
+    elif settings.INVALIDATION_BUS == "local":
+        bus = InvalidationBus()
+    else:
+        raise ValueError(f"Unknown INVALIDATION_BUS {settings.INVALIDATION_BUS!r}")
+
+    bus.subscribe(USER_CHANNEL, lambda key: get_user_cache().invalidate(uuid.UUID(key)))
+    bus.subscribe(
+        TODO_LIST_CHANNEL,
+        lambda key: get_response_cache().invalidate_where(
+            lambda cache_key: cache_key[0] == uuid.UUID(key)
+        ),
+    )
+    return bus
+
+
+@event.listens_for(Session, "before_commit")
+def _publish_pending(session: Session):
+    events = session.info.get(PENDING_INVALIDATIONS)
+    if events:
+        get_invalidation_bus().publish(session, events)
+
+
+@event.listens_for(Session, "after_commit")
+def _dispatch_pending(session: Session):
+    events = session.info.pop(PENDING_INVALIDATIONS, None)
+    if events:
+        bus = get_invalidation_bus()
+        for channel, key in events:
+            bus.dispatch(channel, key)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session: Session):
+    session.info.pop(PENDING_INVALIDATIONS, None)
@@ -1,10 +1,18 @@
+import atexit
 import logging.config
+import random
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from typing import Optional
 
 import structlog
 
-from app.settings import get_settings
+from app.settings import Settings, get_settings
 
-settings = get_settings()
+try:
+    import orjson
+except ImportError:  # optional, falls back to the stdlib json module
+    orjson = None
 
 shared_processors = [
     structlog.contextvars.merge_contextvars,
@@ -13,45 +21,112 @@ shared_processors = [
     structlog.processors.TimeStamper(fmt="iso"),
 ]
 
-logging_config = {
-    "version": 1,
-    "disable_existing_loggers": False,
-    "formatters": {
-        "json": {
-            "()": structlog.stdlib.ProcessorFormatter,
-            "processor": structlog.processors.JSONRenderer(),
-            "foreign_pre_chain": shared_processors,
-        },
-        "console": {
-            "()": structlog.stdlib.ProcessorFormatter,
-            "processor": structlog.dev.ConsoleRenderer(),
-            "foreign_pre_chain": shared_processors,
-        },
-    },
-    "handlers": {
-        "default": {
-            "level": settings.LOG_LEVEL,
-            "class": "logging.StreamHandler",
-            "formatter": "json" if settings.LOGS_AS_JSON else "console",
+
+def orjson_dumps(obj, **kwargs) -> str:
+    "structlog JSONRenderer serializer using orjson, str() anything it can't encode"
+    return orjson.dumps(obj, default=str).decode()
+
+
+def json_renderer() -> structlog.processors.JSONRenderer:
+    if orjson is not None:
+        return structlog.processors.JSONRenderer(serializer=orjson_dumps)
+    return structlog.processors.JSONRenderer()
+
+
+def build_logging_config(settings: Settings) -> dict:
+    return {
+        "version": 1,
+        "disable_existing_loggers": False,
+        "formatters": {
+            "json": {
+                "()": structlog.stdlib.ProcessorFormatter,
+                "processor": json_renderer(),
+                "foreign_pre_chain": shared_processors,
+            },
+            "console": {
+                "()": structlog.stdlib.ProcessorFormatter,
+                "processor": structlog.dev.ConsoleRenderer(),
+                "foreign_pre_chain": shared_processors,
+            },
         },
-    },
-    "loggers": {
-        "": {"handlers": ["default"], "level": "INFO"},
-        "uvicorn.error": {
-            "handlers": ["default"],
-            "level": "INFO",
-            "propagate": False,
+        "handlers": {
+            "default": {
+                "level": settings.LOG_LEVEL,
+                "class": "logging.StreamHandler",
+                "formatter": "json" if settings.LOGS_AS_JSON else "console",
+            },
         },
-        "uvicorn.access": {
-            "handlers": ["default"],
-            "level": "INFO",
-            "propagate": False,
+        "loggers": {
+            "": {"handlers": ["default"], "level": "INFO"},
+            "uvicorn.error": {
+                "handlers": ["default"],
+                "level": "INFO",
+                "propagate": False,
+            },
+            "uvicorn.access": {
+                "handlers": ["default"],
+                "level": "INFO",
+                "propagate": False,
+            },
         },
-    },
-}
+    }
+
+
+class SampleFilter(logging.Filter):
+    "Let through a random `rate` fraction of records"
+
+    def __init__(self, rate: float) -> None:
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return random.random() < self.rate
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler that passes records through untouched.  The stdlib version
+    formats the message in prepare(), on the calling thread, which is exactly
+    the work we want to move to the listener thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+_queue_listener: Optional[QueueListener] = None
+
+
+def _start_queue_listener():
+    "Swap the 'default' StreamHandler for a queue drained by a background thread"
+    global _queue_listener
+    root = logging.getLogger()
+    stream_handler = root.handlers[0]
+    queue = SimpleQueue()
+    queue_handler = DeferredQueueHandler(queue)
+    for name in ("", "uvicorn.error", "uvicorn.access"):
+        logger = logging.getLogger(name)
+        logger.handlers = [
+            queue_handler if handler is stream_handler else handler
+            for handler in logger.handlers
+        ]
+    _queue_listener = QueueListener(queue, stream_handler, respect_handler_level=True)
+    _queue_listener.start()
+
+
+def stop_queue_listener():
+    "Flush queued records and stop the background logging thread, if running"
+    global _queue_listener
+    if _queue_listener is not None:
+        _queue_listener.stop()
+        _queue_listener = None
+
+
+atexit.register(stop_queue_listener)
 
 
-def setup_logging():
+def setup_logging(settings: Optional[Settings] = None):
+    settings = settings or get_settings()
     structlog.configure(
         processors=[
             structlog.stdlib.filter_by_level,
@@ -59,13 +134,27 @@ def setup_logging():
             structlog.stdlib.PositionalArgumentsFormatter(),
             structlog.processors.StackInfoRenderer(),
             structlog.processors.format_exc_info,
-            # structlog.stdlib.ProcessorFormatter.wrap_for_formatter,
+            structlog.stdlib.ProcessorFormatter.wrap_for_formatter,
         ],
         context_class=dict,
         logger_factory=structlog.stdlib.LoggerFactory(),
         wrapper_class=structlog.stdlib.BoundLogger,
         cache_logger_on_first_use=True,
     )
-    logging.config.dictConfig(logging_config)
+    stop_queue_listener()
+    logging.config.dictConfig(build_logging_config(settings))
+    if settings.LOG_PROFILE == "prod":
+        _start_queue_listener()
 
-    logging.getLogger("sqlalchemy.engine").setLevel(logging.INFO)
+    # Statement echo formats every SQL statement and its parameters
+    sample_rate = settings.SQL_LOG_SAMPLE_RATE
+    if sample_rate is None:
+        sample_rate = 0.0 if settings.LOG_PROFILE == "prod" else 1.0
+    sql_logger = logging.getLogger("sqlalchemy.engine")
+    sql_logger.setLevel(logging.WARNING if sample_rate <= 0 else logging.INFO)
+    # Logger filters only see records logged directly to that logger, and
+    # SQLAlchemy logs statements to this child
+    engine_logger = logging.getLogger("sqlalchemy.engine.Engine")
+    engine_logger.filters = []
+    if 0 < sample_rate < 1:
+        engine_logger.addFilter(SampleFilter(sample_rate))
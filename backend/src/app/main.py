@@ -2,8 +2,13 @@ from fastapi import FastAPI
 
 from app.auth import router as AuthRouter
 from app.crud import router as CrudRouter
+from app.db import dispose_engine, init_engine
 from app.debug import router as DebugRouter
+from app.invalidation import get_invalidation_bus
 from app.log_utils import setup_logging
+from app.metrics import MetricsMiddleware
+from app.metrics import router as MetricsRouter
+from app.revocation import get_revocation_list
 from app.settings import get_settings
 
 setup_logging()
@@ -17,6 +22,21 @@ def build_app() -> FastAPI:
     app.include_router(AuthRouter)
     app.include_router(CrudRouter)
     app.include_router(DebugRouter)
+    app.include_router(MetricsRouter)
+    app.add_middleware(MetricsMiddleware, fastapi_app=app)
+
+    @app.on_event("startup")
+    async def startup():
+        init_engine()
+        await get_invalidation_bus().start()
+        await get_revocation_list().start()
+
+    @app.on_event("shutdown")
+    async def shutdown():
+        await get_invalidation_bus().stop()
+        await get_revocation_list().stop()
+        await dispose_engine()
+
     return app
 
 
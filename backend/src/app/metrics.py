@@ -0,0 +1,299 @@
+"""
+Minimal in-process metrics with a Prometheus text-format /metrics endpoint.
+
+Every backend process keeps its own registry, so each replica behind Traefik
+(or each worker process) has to be scraped on its own.  Values are only
+touched from the event loop thread (SQLAlchemy engine events run in the
+greenlet of the awaiting coroutine), and /metrics is an async route so it
+renders on that thread too, so there is no locking.
+"""
+
+import abc
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from fastapi import APIRouter, FastAPI, Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.075,
+    0.1,
+    0.25,
+    0.5,
+    0.75,
+    1.0,
+    2.5,
+    5.0,
+    7.5,
+    10.0,
+)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(str(v))}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Metric(abc.ABC):
+    type: str = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+
+    @abc.abstractmethod
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        "Yield (name suffix, formatted labels, value) for each sample"
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {float(value)}")
+        return lines
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()) -> None:
+        super().__init__(name, help, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def samples(self):
+        for labels, value in self._values.items():
+            yield "", _format_labels(self.label_names, labels), value
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels: str, value: float) -> None:
+        self._values[labels] = value
+
+
+class CallbackGauge(Metric):
+    """
+    Gauge (or counter) whose samples are read at scrape time from `callback`,
+    which returns a mapping of label values to the current value.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        callback: Callable[[], Dict[LabelValues, float]],
+        labels: Sequence[str] = (),
+        type: str = "gauge",
+    ) -> None:
+        super().__init__(name, help, labels)
+        self.callback = callback
+        self.type = type
+
+    def samples(self):
+        for labels, value in self.callback().items():
+            yield "", _format_labels(self.label_names, labels), value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [count per bucket..., +Inf count, sum]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, *labels: str, value: float) -> None:
+        counts = self._values.get(labels)
+        if counts is None:
+            counts = self._values[labels] = [0.0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        else:
+            counts[len(self.buckets)] += 1
+        counts[-1] += value
+
+    def samples(self):
+        for labels, counts in self._values.items():
+            label_names = self.label_names + ("le",)
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield "_bucket", _format_labels(label_names, labels + (le,)), cumulative
+            formatted = _format_labels(self.label_names, labels)
+            yield "_sum", formatted, counts[-1]
+            yield "_count", formatted, cumulative
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+http_requests = REGISTRY.register(
+    Counter(
+        "http_requests_total",
+        "HTTP requests handled, by route template and status code",
+        labels=("method", "route", "status"),
+    )
+)
+http_request_duration = REGISTRY.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "Time to handle an HTTP request, including streaming the response body",
+        labels=("method", "route"),
+    )
+)
+http_requests_in_progress = REGISTRY.register(
+    Gauge(
+        "http_requests_in_progress",
+        "HTTP requests currently being handled",
+        labels=("method",),
+    )
+)
+db_pool_checkout_wait = REGISTRY.register(
+    Histogram(
+        "db_pool_checkout_wait_seconds",
+        "Time spent waiting for a pooled database connection",
+        buckets=(0.0005, 0.001, 0.005) + DEFAULT_BUCKETS,
+    )
+)
+db_statement_duration = REGISTRY.register(
+    Histogram(
+        "db_statement_duration_seconds",
+        "Database statement execution time, by statement type",
+        labels=("statement",),
+        buckets=(0.0005, 0.001) + DEFAULT_BUCKETS,
+    )
+)
+
+
+# Request metrics -------------------------------------------------------------
+class MetricsMiddleware:
+    """
+    ASGI middleware recording request counts, latency, and in-flight requests.
+
+    Routes are labelled with their path template (/todo/{id}), looked up from
+    the endpoint the router matched, so that ids don't explode label cardinality.
+    """
+
+    def __init__(self, app: ASGIApp, fastapi_app: FastAPI) -> None:
+        self.app = app
+        self.fastapi_app = fastapi_app
+        self._route_paths: Optional[Dict[Callable, str]] = None
+
+    def route_path(self, scope: Scope) -> str:
+        if self._route_paths is None:
+            self._route_paths = {
+                getattr(route, "endpoint", None): route.path
+                for route in self.fastapi_app.routes
+            }
+        return self._route_paths.get(scope.get("endpoint"), "<unmatched>")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = "500"
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        http_requests_in_progress.inc(method)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            http_requests_in_progress.dec(method)
+            # The router has filled in scope["endpoint"] by now
+            route = self.route_path(scope)
+            http_requests.inc(method, route, status)
+            http_request_duration.observe(method, route, value=duration)
+
+
+# Database metrics ------------------------------------------------------------
+class TimedAsyncAdaptedQueuePool(AsyncAdaptedQueuePool):
+    "Default asyncio connection pool, timing how long checkouts wait"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            db_pool_checkout_wait.observe(value=time.perf_counter() - start)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_start_time = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - context._metrics_start_time
+    verb = statement.lstrip().split(None, 1)[0].upper() if statement else ""
+    db_statement_duration.observe(verb, value=duration)
+
+
+def instrument_engine(engine: Engine) -> None:
+    "Time every statement run through a (sync, or AsyncEngine.sync_engine) engine"
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+router = APIRouter()
+
+
+# async so that rendering runs on the event loop, the only thread that
+# updates the registry, rather than in the threadpool
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    "Prometheus text exposition of this process's metrics"
+    return Response(REGISTRY.render(), media_type="text/plain; version=0.0.4")
@@ -1,12 +1,62 @@
 import uuid
-from typing import Optional, Union
+from datetime import datetime, timedelta, timezone
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    ClassVar,
+    Dict,
+    Hashable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    Union,
+)
 
 import sqlalchemy as sa
 import sqlalchemy.orm
 from pydantic import BaseModel
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.dialects.postgresql import UUID as PostgresUUID
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm.attributes import set_attribute
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_attribute, set_committed_value
+from sqlalchemy.orm.interfaces import LoaderOption
+
+from app.cache import USER_CHANNEL, get_user_cache, invalidate_on_commit
+from app.settings import get_settings
+
+LoadOptions = Optional[Sequence[LoaderOption]]
+
+# Index.info key holding the bucket count of a hash-sharded index
+HASH_SHARD_BUCKETS = "hash_shard_buckets"
+
+
+def hash_sharded_index(name: str, *columns: str, buckets: int = 16) -> sa.Index:
+    """
+    Index whose entries are spread over `buckets` ranges by a hash of its
+    columns.  Use it for indexes on time-ordered columns such as created_at,
+    where new rows would otherwise all land in the last range of the index,
+    on one node.  Range scans still work, but ordered scans read every bucket.
+    """
+    return sa.Index(name, *columns, info={HASH_SHARD_BUCKETS: buckets})
+
+
+@compiles(sa.schema.CreateIndex, "cockroachdb")
+def _create_hash_sharded_index(create, compiler, **kw):
+    sql = compiler.visit_create_index(create, **kw)
+    buckets = create.element.info.get(HASH_SHARD_BUCKETS)
+    if not buckets:
+        return sql
+    # USING HASH goes right after the column list, before INCLUDE or WHERE
+    using = f" USING HASH WITH BUCKET_COUNT = {int(buckets)}"
+    for clause in (" INCLUDE (", " WHERE "):
+        if clause in sql:
+            return sql.replace(clause, using + clause, 1)
+    return sql + using
 
 
 @sa.orm.as_declarative()
@@ -23,6 +73,38 @@ class BaseDAO:
         sa.TIMESTAMP(timezone=True), default=sa.func.now(), nullable=False
     )
 
+    # Query methods load nothing beyond the row itself unless asked, whatever
+    # the relationship's mapper default.  Pass `options`, e.g.
+    # [sa.orm.joinedload(UserDAO.organization)], to a query method to load
+    # relationships, or override this on a DAO to change its default.
+    default_load_options: Tuple[LoaderOption, ...] = (sa.orm.raiseload("*"),)
+
+    # Statements of the common query methods are built once per DAO class
+    # and reused, with values passed as bind parameters when executed.  That
+    # skips building the construct and generating its compiled-cache key on
+    # every call.  Calls passing their own `options` get a fresh statement.
+    _statements: ClassVar[Dict[Tuple[type, Hashable], Any]] = {}
+
+    @classmethod
+    def _with_load_options(cls, statement, options: LoadOptions = None):
+        "Apply the caller's loader options, or the DAO's defaults"
+        if options is None:
+            options = cls.default_load_options
+        return statement.options(*options)
+
+    @classmethod
+    def _statement(
+        cls, key: Hashable, build: Callable[[], Any], options: LoadOptions = None
+    ):
+        "build() with load options applied, cached per class and key by default"
+        if options is not None:
+            return cls._with_load_options(build(), options)
+        statement = BaseDAO._statements.get((cls, key))
+        if statement is None:
+            statement = cls._with_load_options(build())
+            BaseDAO._statements[(cls, key)] = statement
+        return statement
+
     @classmethod
     async def new(cls, session: AsyncSession, api_model: Union[BaseModel, dict]):
         if isinstance(api_model, BaseModel):
@@ -34,23 +116,85 @@ class BaseDAO:
 
     @classmethod
     async def create(cls, session: AsyncSession, api_model: Union[BaseModel, dict]):
-        model = await cls.new(session, api_model)
-        await session.flush()
-        await session.refresh(model)
+        """
+        INSERT a new row and return it as a persistent ORM object, using a
+        single INSERT ... RETURNING round trip (server defaults included)
+        instead of add / flush / refresh.
+
+        Relationships on the returned object are not loaded.  If api_model
+        sets relationships instead of plain columns (e.g. "user" rather than
+        "user_id"), this falls back to letting the unit of work handle it.
+        """
+        if isinstance(api_model, BaseModel):
+            api_model = api_model.dict()
+
+        table = cls.__table__
+        if not all(key in table.c for key in api_model):
+            model = await cls.new(session, api_model)
+            await session.flush()
+            await session.refresh(model)
+            return model
+
+        statement = sa.insert(table).values(**api_model).returning(*table.c)
+        results = await session.execute(statement)
+        row = results.one()
+
+        model = cls()
+        for attr in cls.__mapper__.column_attrs:
+            set_committed_value(model, attr.key, row._mapping[attr.columns[0]])
+        # Give the object an identity and put it in the session as if loaded
+        make_transient_to_detached(model)
+        session.add(model)
         return model
 
     @classmethod
-    async def get(cls, session: AsyncSession, id: uuid.UUID):
-        statement = sa.select(cls).where(cls.id == id)
-        results = await session.execute(statement)
+    async def get(
+        cls, session: AsyncSession, id: uuid.UUID, options: LoadOptions = None
+    ):
+        statement = cls._statement(
+            "get", lambda: sa.select(cls).where(cls.id == sa.bindparam("id")), options
+        )
+        results = await session.execute(statement, {"id": id})
         return results.scalars().one_or_none()
 
     @classmethod
-    async def get_all(cls, session: AsyncSession):
-        statement = sa.select(cls)
+    async def get_all(cls, session: AsyncSession, options: LoadOptions = None):
+        statement = cls._statement("get_all", lambda: sa.select(cls), options)
         results = await session.execute(statement)
         return results.scalars().all()
 
+    # Read-only queries for responses select just the columns a response
+    # model needs from the table, not the mapped class.  They return Row
+    # objects (named tuples, which orm_mode schemas read like ORM objects)
+    # without building instances or adding anything to the identity map.
+    @classmethod
+    def columns_for(cls, model: Type[BaseModel], *extra: str) -> List[sa.Column]:
+        "Table columns for model's fields, in field order, then `extra` columns"
+        names = dict.fromkeys([*model.__fields__, *extra])
+        return [cls.__table__.c[name] for name in names]
+
+    @classmethod
+    async def get_row(
+        cls, session: AsyncSession, id: uuid.UUID, model: Type[BaseModel], *extra: str
+    ) -> Optional[sa.engine.Row]:
+        "get, as a Row of the columns for model (see columns_for)"
+        statement = cls._statement(
+            ("get_row", model, extra),
+            lambda: sa.select(*cls.columns_for(model, *extra)).where(
+                cls.__table__.c.id == sa.bindparam("id")
+            ),
+        )
+        results = await session.execute(statement, {"id": id})
+        return results.one_or_none()
+
+    @classmethod
+    async def get_all_rows(
+        cls, session: AsyncSession, model: Type[BaseModel], *extra: str
+    ) -> List[sa.engine.Row]:
+        "get_all, as Rows of the columns for model (see columns_for)"
+        results = await session.execute(sa.select(*cls.columns_for(model, *extra)))
+        return results.all()
+
     def update(self, api_model: Optional[Union[BaseModel, dict]] = None, **kwargs):
         """Update instance attributes by passing a model, dict, or kwargs to update"""
         if api_model:
@@ -63,10 +207,126 @@ class BaseDAO:
 
     @classmethod
     async def delete(cls, session: AsyncSession, id: uuid.UUID):
-        statement = sa.delete(cls).where(cls.id == id)
-        results = await session.execute(statement)
+        # The "evaluate" session sync can't see bind parameter values, so the
+        # deleted object (if loaded) is expunged here instead
+        statement = cls._statement(
+            "delete",
+            lambda: sa.delete(cls)
+            .where(cls.id == sa.bindparam("id"))
+            .execution_options(synchronize_session=False),
+        )
+        results = await session.execute(statement, {"id": id})
+        key = cls.__mapper__.identity_key_from_primary_key([id])
+        deleted = session.identity_map.get(key)
+        if deleted is not None:
+            session.expunge(deleted)
         return results.rowcount
 
+    # Bulk operations are Core statements against the table, one round trip
+    # per call.  They return Row objects rather than ORM instances, and don't
+    # touch objects already loaded into the session.
+    @classmethod
+    async def bulk_create(
+        cls, session: AsyncSession, api_models: Sequence[Union[BaseModel, dict]]
+    ) -> List[sa.engine.Row]:
+        "INSERT many rows with a single multi-VALUES statement, in input order"
+        if not api_models:
+            return []
+        rows = []
+        for api_model in api_models:
+            if isinstance(api_model, BaseModel):
+                api_model = api_model.dict()
+            # Assign ids client-side so results can be matched back to input
+            rows.append({"id": uuid.uuid4(), **api_model})
+        table = cls.__table__
+        statement = sa.insert(table).values(rows).returning(*table.c)
+        results = await session.execute(statement)
+        by_id = {row.id: row for row in results}
+        return [by_id[row["id"]] for row in rows]
+
+    @classmethod
+    async def bulk_update(
+        cls,
+        session: AsyncSession,
+        api_models: Sequence[Union[BaseModel, dict]],
+        where: Optional[sa.sql.ClauseElement] = None,
+    ) -> Dict[uuid.UUID, sa.engine.Row]:
+        """
+        UPDATE many rows, each identified by its "id" key.  Only the fields
+        that are set on each item are updated.  Items setting the same fields
+        share one UPDATE ... FROM statement whose values are passed as one
+        typed array parameter per column.  Rows not matching `where` (e.g. an
+        owner check) are left alone.
+
+        Returns updated rows keyed by id, missing ids are left out.
+        """
+        groups: Dict[Tuple[str, ...], List[dict]] = {}
+        for api_model in api_models:
+            if isinstance(api_model, BaseModel):
+                api_model = api_model.dict(exclude_unset=True)
+            fields = tuple(sorted(key for key in api_model if key != "id"))
+            groups.setdefault(fields, []).append(api_model)
+
+        table = cls.__table__
+        updated = {}
+        for fields, items in groups.items():
+            if not fields:
+                # Nothing to set, but still report which ids exist
+                statement = sa.select(table).where(
+                    table.c.id.in_([item["id"] for item in items])
+                )
+            else:
+                columns = []
+                for key in ("id",) + fields:
+                    array_type = ARRAY(table.c[key].type)
+                    values = [item[key] for item in items]
+                    param = sa.bindparam(f"{key}_values", values, type_=array_type)
+                    param = sa.cast(param, array_type)
+                    columns.append(sa.func.unnest(param).label(key))
+                data = sa.select(*columns).subquery("data")
+                statement = (
+                    sa.update(table)
+                    .where(table.c.id == data.c.id)
+                    .values({key: data.c[key] for key in fields})
+                    .returning(*table.c)
+                )
+            if where is not None:
+                statement = statement.where(where)
+            results = await session.execute(statement)
+            updated.update({row.id: row for row in results})
+        return updated
+
+    @classmethod
+    async def bulk_delete(
+        cls,
+        session: AsyncSession,
+        ids: Sequence[uuid.UUID],
+        where: Optional[sa.sql.ClauseElement] = None,
+    ) -> List[uuid.UUID]:
+        """
+        DELETE many rows by id in one statement, returning the ids that
+        existed (and matched `where`, if given)
+        """
+        if not ids:
+            return []
+        table = cls.__table__
+        statement = sa.delete(table).where(table.c.id.in_(ids)).returning(table.c.id)
+        if where is not None:
+            statement = statement.where(where)
+        results = await session.execute(statement)
+        return results.scalars().all()
+
+
+# Hash-sharded indexes are behind a session setting before CockroachDB 22.1
+# (where it's always on), for create_all in tests and notebooks
+sa.event.listen(
+    BaseDAO.metadata,
+    "before_create",
+    sa.DDL("SET experimental_enable_hash_sharded_indexes = on").execute_if(
+        dialect="cockroachdb"
+    ),
+)
+
 
 class OrganizationDAO(BaseDAO):
     __tablename__ = "organizations"
@@ -77,8 +337,11 @@ class OrganizationDAO(BaseDAO):
     users = sa.orm.relationship("UserDAO", back_populates="organization")
 
     @classmethod
-    async def get_users_by_name(cls, session: AsyncSession, name: str):
+    async def get_users_by_name(
+        cls, session: AsyncSession, name: str, options: LoadOptions = None
+    ):
         statement = sa.select(cls).where(cls.name == name)
+        statement = cls._with_load_options(statement, options)
         results = await session.execute(statement)
         return results.scalars().all()
 
@@ -94,8 +357,11 @@ class SpaceDAO(BaseDAO):
     todos = sa.orm.relationship("TodoDAO", back_populates="space")
 
     @classmethod
-    async def get_todos_by_name(cls, session: AsyncSession, name: str):
+    async def get_todos_by_name(
+        cls, session: AsyncSession, name: str, options: LoadOptions = None
+    ):
         statement = sa.select(cls).where(cls.name == name)
+        statement = cls._with_load_options(statement, options)
         results = await session.execute(statement)
         return results.scalars().all()
 
@@ -110,33 +376,306 @@ class UserDAO(BaseDAO):
     organization_id = sa.Column(
         PostgresUUID(as_uuid=True), sa.ForeignKey("organizations.id"), index=True
     )
-    organization = sa.orm.relationship("OrganizationDAO", back_populates="users", lazy='selectin')
+    organization = sa.orm.relationship(
+        "OrganizationDAO", back_populates="users", lazy="selectin"
+    )
     todos = sa.orm.relationship("TodoDAO", back_populates="user")
 
     @classmethod
-    async def get_user_by_name(cls, session: AsyncSession, name: str):
-        statement = sa.select(cls).where(cls.name == name)
-        results = await session.execute(statement)
+    async def get_user_by_name(
+        cls, session: AsyncSession, name: str, options: LoadOptions = None
+    ):
+        statement = cls._statement(
+            "get_user_by_name",
+            lambda: sa.select(cls).where(cls.name == sa.bindparam("name")),
+            options,
+        )
+        results = await session.execute(statement, {"name": name})
         db_user = results.scalars().one_or_none()
         return db_user
 
+    @classmethod
+    async def get_user_id_by_name(
+        cls, session: AsyncSession, name: str
+    ) -> Optional[uuid.UUID]:
+        statement = cls._statement(
+            "get_user_id_by_name",
+            lambda: sa.select(cls.id).where(cls.name == sa.bindparam("name")),
+        )
+        results = await session.execute(statement, {"name": name})
+        return results.scalar_one_or_none()
+
+    def update(self, api_model: Optional[Union[BaseModel, dict]] = None, **kwargs):
+        super().update(api_model, **kwargs)
+        session = sa.orm.object_session(self)
+        if session is None:
+            get_user_cache().invalidate(self.id)
+        else:
+            invalidate_on_commit(session, USER_CHANNEL, self.id)
+
+    @classmethod
+    async def delete(cls, session: AsyncSession, id: uuid.UUID):
+        rowcount = await super().delete(session, id)
+        invalidate_on_commit(session, USER_CHANNEL, id)
+        return rowcount
+
+    @classmethod
+    async def bulk_update(
+        cls,
+        session: AsyncSession,
+        api_models: Sequence[Union[BaseModel, dict]],
+        where: Optional[sa.sql.ClauseElement] = None,
+    ):
+        updated = await super().bulk_update(session, api_models, where)
+        for id in updated:
+            invalidate_on_commit(session, USER_CHANNEL, id)
+        return updated
+
+    @classmethod
+    async def bulk_delete(
+        cls,
+        session: AsyncSession,
+        ids: Sequence[uuid.UUID],
+        where: Optional[sa.sql.ClauseElement] = None,
+    ):
+        deleted = await super().bulk_delete(session, ids, where)
+        for id in deleted:
+            invalidate_on_commit(session, USER_CHANNEL, id)
+        return deleted
+
 
 class TodoDAO(BaseDAO):
     __tablename__ = "todo"
+    # A user's or space's todos, newest first, without touching the primary
+    # index: the key matches _keyset_statement's filter and order, and the
+    # columns TodoOut and list ETags read are stored in the index.  Those lead
+    # with user_id / space_id, so their inserts are spread out already, but
+    # created_at alone only grows and is sharded to avoid one hot range.
+    __table_args__ = (
+        hash_sharded_index("ix_todo_created_at", "created_at"),
+        sa.Index(
+            "ix_todo_user_id_created_at_id",
+            "user_id",
+            "created_at",
+            "id",
+            postgresql_include=["title", "content", "space_id", "updated_at"],
+        ),
+        sa.Index(
+            "ix_todo_space_id_created_at_id",
+            "space_id",
+            "created_at",
+            "id",
+            postgresql_include=["title", "content", "user_id", "updated_at"],
+        ),
+    )
 
     title = sa.Column(sa.String)
     content = sa.Column(sa.String)
-    user_id = sa.Column(
-        PostgresUUID(as_uuid=True), sa.ForeignKey("users.id"), index=True
-    )
+    user_id = sa.Column(PostgresUUID(as_uuid=True), sa.ForeignKey("users.id"))
     user = sa.orm.relationship("UserDAO", back_populates="todos", lazy="selectin")
-    space_id = sa.Column(
-        PostgresUUID(as_uuid=True), sa.ForeignKey("spaces.id"), index=True
-    )
+    space_id = sa.Column(PostgresUUID(as_uuid=True), sa.ForeignKey("spaces.id"))
     space = sa.orm.relationship("SpaceDAO", back_populates="todos", lazy="selectin")
+    # Bumped by every UPDATE, ORM or Core, for ETags (see app.crud.todo_etag)
+    updated_at = sa.Column(
+        sa.TIMESTAMP(timezone=True),
+        default=sa.func.now(),
+        onupdate=sa.func.now(),
+        nullable=False,
+    )
+
+    @classmethod
+    async def get_todos_by_username(
+        cls, session: AsyncSession, name: str, options: LoadOptions = None
+    ):
+        """
+        All of a user's todos, newest first.  The user id is looked up first
+        so the todos are read from the user_id index, see _keyset_statement.
+        """
+        user_id = await UserDAO.get_user_id_by_name(session, name)
+        if user_id is None:
+            return []
+        statement = cls._keyset_statement(user_id, options=options)
+        results = await session.execute(statement)
+        return results.scalars().all()
+
+    @classmethod
+    async def get_todo_rows_by_username(
+        cls, session: AsyncSession, name: str, model: Type[BaseModel], *extra: str
+    ) -> List[sa.engine.Row]:
+        "get_todos_by_username, as Rows of the columns for model (see columns_for)"
+        user_id = await UserDAO.get_user_id_by_name(session, name)
+        if user_id is None:
+            return []
+        columns = cls.columns_for(model, *extra)
+        statement = cls._keyset_statement(user_id, columns=columns)
+        results = await session.execute(statement)
+        return results.all()
+
+    @classmethod
+    def _keyset_statement(
+        cls,
+        user_id: uuid.UUID,
+        after: Optional[Tuple[datetime, uuid.UUID]] = None,
+        limit: Optional[int] = None,
+        options: LoadOptions = None,
+        columns: Optional[Sequence[Any]] = None,
+    ):
+        """
+        Todos for a user, newest first, ordered on (created_at, id) so that
+        `after` (the key of the last row a client has seen) can seek straight
+        to the next page instead of using OFFSET.  Selects `columns` as Core
+        rows instead of TodoDAO objects if given.
+        """
+        statement = sa.select(*columns) if columns else sa.select(cls)
+        statement = statement.where(cls.user_id == user_id).order_by(
+            cls.created_at.desc(), cls.id.desc()
+        )
+        statement = cls._with_load_options(statement, options)
+        if after is not None:
+            statement = statement.where(
+                sa.tuple_(cls.created_at, cls.id) < sa.tuple_(*after)
+            )
+        if limit is not None:
+            statement = statement.limit(limit)
+        return statement
+
+    @classmethod
+    async def get_todos_page(
+        cls,
+        session: AsyncSession,
+        user_id: uuid.UUID,
+        limit: int,
+        after: Optional[Tuple[datetime, uuid.UUID]] = None,
+        options: LoadOptions = None,
+    ):
+        "Return one keyset-paginated page of a user's todos, see _keyset_statement"
+        statement = cls._keyset_statement(
+            user_id, after=after, limit=limit, options=options
+        )
+        results = await session.execute(statement)
+        return results.scalars().all()
+
+    @classmethod
+    async def stream_todos(
+        cls,
+        session: AsyncSession,
+        user_id: uuid.UUID,
+        after: Optional[Tuple[datetime, uuid.UUID]] = None,
+        limit: Optional[int] = None,
+        batch_size: int = 500,
+        options: LoadOptions = None,
+    ) -> AsyncIterator["TodoDAO"]:
+        """
+        Yield a user's todos from a server-side cursor, fetching `batch_size`
+        rows at a time so memory use doesn't grow with the size of the list.
+        """
+        statement = cls._keyset_statement(
+            user_id, after=after, limit=limit, options=options
+        )
+        statement = statement.execution_options(yield_per=batch_size)
+        results = await session.stream(statement)
+        async for todo in results.scalars():
+            yield todo
 
     @classmethod
-    async def get_todos_by_username(cls, session: AsyncSession, name: str):
-        statement = sa.select(cls).join(UserDAO).where(UserDAO.name == name)
+    async def get_todo_rows_page(
+        cls,
+        session: AsyncSession,
+        user_id: uuid.UUID,
+        model: Type[BaseModel],
+        limit: int,
+        after: Optional[Tuple[datetime, uuid.UUID]] = None,
+    ) -> List[sa.engine.Row]:
+        "get_todos_page, as Rows of the columns for model (see columns_for)"
+        # created_at and id are needed for the next page's cursor, updated_at
+        # for the page's ETag
+        columns = cls.columns_for(model, "created_at", "id", "updated_at")
+        statement = cls._keyset_statement(
+            user_id, after=after, limit=limit, columns=columns
+        )
+        results = await session.execute(statement)
+        return results.all()
+
+    @classmethod
+    async def stream_todo_rows(
+        cls,
+        session: AsyncSession,
+        user_id: uuid.UUID,
+        model: Type[BaseModel],
+        after: Optional[Tuple[datetime, uuid.UUID]] = None,
+        limit: Optional[int] = None,
+        batch_size: int = 500,
+    ) -> AsyncIterator[sa.engine.Row]:
+        "stream_todos, as Rows of the columns for model (see columns_for)"
+        statement = cls._keyset_statement(
+            user_id, after=after, limit=limit, columns=cls.columns_for(model)
+        )
+        statement = statement.execution_options(yield_per=batch_size)
+        results = await session.stream(statement)
+        async for row in results:
+            yield row
+
+
+class InvalidationEventDAO(BaseDAO):
+    "Cache invalidations for other backend processes to pick up, see app.invalidation"
+    __tablename__ = "invalidation_events"
+    __table_args__ = (sa.Index("ix_invalidation_events_created_at", "created_at"),)
+
+    channel = sa.Column(sa.String, nullable=False)
+    key = sa.Column(sa.String, nullable=False)
+
+    @classmethod
+    async def get_since(cls, session: AsyncSession, since: datetime):
+        statement = (
+            sa.select(cls.id, cls.channel, cls.key, cls.created_at)
+            .where(cls.created_at > since)
+            .order_by(cls.created_at)
+        )
+        results = await session.execute(statement)
+        return results.all()
+
+    @classmethod
+    async def delete_before(cls, session: AsyncSession, before: datetime):
+        statement = sa.delete(cls).where(cls.created_at < before)
+        results = await session.execute(statement)
+        return results.rowcount
+
+
+class RevokedTokenDAO(BaseDAO):
+    """
+    Revoked JWTs, by jti for single tokens or by user_id for every token the
+    user was issued up to created_at.  Rows are only needed until the tokens
+    they revoke would have expired anyway.  See app.revocation.
+    """
+
+    __tablename__ = "revoked_tokens"
+    __table_args__ = (
+        sa.Index("ix_revoked_tokens_created_at", "created_at"),
+        sa.Index("ix_revoked_tokens_expires_at", "expires_at"),
+    )
+
+    jti = sa.Column(sa.String, nullable=True)
+    # No foreign key, revoking a deleted user's tokens is the main use
+    user_id = sa.Column(PostgresUUID(as_uuid=True), nullable=True)
+    expires_at = sa.Column(sa.TIMESTAMP(timezone=True), nullable=False)
+
+    @classmethod
+    def for_user(cls, user_id: uuid.UUID) -> "RevokedTokenDAO":
+        "Revocation of every token issued to user_id so far"
+        ttl = timedelta(seconds=get_settings().REFRESH_TOKEN_TTL)
+        return cls(user_id=user_id, expires_at=datetime.now(timezone.utc) + ttl)
+
+    @classmethod
+    async def get_active(cls, session: AsyncSession, since: Optional[datetime] = None):
+        "Revocations that haven't expired, only those created after since if given"
+        statement = sa.select(cls).where(cls.expires_at > sa.func.now())
+        if since is not None:
+            statement = statement.where(cls.created_at > since)
         results = await session.execute(statement)
         return results.scalars().all()
+
+    @classmethod
+    async def delete_expired(cls, session: AsyncSession):
+        statement = sa.delete(cls).where(cls.expires_at <= sa.func.now())
+        results = await session.execute(statement)
+        return results.rowcount
@@ -0,0 +1,120 @@
+"""
+Salted password hashing with scrypt (hashlib, so no extra dependency).
+
+Hashing is deliberately slow, tens of milliseconds of CPU per call, so the
+async helpers run it in a bounded executor instead of on the event loop.
+OpenSSL's scrypt releases the GIL, so the default thread pool really does
+hash in parallel.  PASSWORD_HASH_EXECUTOR=process switches to a process pool.
+
+Stored hashes look like "scrypt$<n>$<r>$<p>$<salt>$<hash>" (base64 salt and
+hash).  Anything else in UserDAO.password is a legacy plaintext password,
+which login verifies and then replaces with a hash.  A NULL password never
+verifies.
+"""
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Optional
+
+from app.settings import get_settings
+
+PREFIX = "scrypt"
+SCRYPT_R = 8
+SCRYPT_P = 1
+SALT_BYTES = 16
+HASH_BYTES = 32
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.b64encode(data).decode().rstrip("=")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.b64decode(data + "=" * (-len(data) % 4))
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(
+        password.encode(),
+        salt=salt,
+        n=n,
+        r=r,
+        p=p,
+        # OpenSSL's default 32MB limit is just under what n=2**15 needs
+        maxmem=256 * n * r,
+        dklen=HASH_BYTES,
+    )
+
+
+def hash_password(password: str, n: int) -> str:
+    "Salted scrypt hash of password, with cost n (a power of two)"
+    salt = os.urandom(SALT_BYTES)
+    digest = _scrypt(password, salt, n, SCRYPT_R, SCRYPT_P)
+    return f"{PREFIX}${n}${SCRYPT_R}${SCRYPT_P}${_b64encode(salt)}${_b64encode(digest)}"
+
+
+def is_hashed(stored: str) -> bool:
+    return stored.startswith(PREFIX + "$")
+
+
+def verify_password(password: str, stored: Optional[str]) -> bool:
+    "Check password against a stored hash (or legacy plaintext) in constant time"
+    if not stored:
+        return False
+    if not is_hashed(stored):
+        return hmac.compare_digest(password.encode(), stored.encode())
+    try:
+        _, n, r, p, salt, digest = stored.split("$")
+        expected = _b64decode(digest)
+        actual = _scrypt(password, _b64decode(salt), int(n), int(r), int(p))
+    except ValueError:
+        return False
+    return hmac.compare_digest(actual, expected)
+
+
+def needs_rehash(stored: Optional[str], n: int) -> bool:
+    "Whether stored is plaintext, or was hashed with other parameters"
+    if not stored:
+        return False
+    if not is_hashed(stored):
+        return True
+    parts = stored.split("$")
+    return parts[1:4] != [str(n), str(SCRYPT_R), str(SCRYPT_P)]
+
+
+@lru_cache
+def get_password_executor() -> Executor:
+    "Process-wide executor that password hashing runs in"
+    settings = get_settings()
+    if settings.PASSWORD_HASH_EXECUTOR == "process":
+        return ProcessPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS)
+    if settings.PASSWORD_HASH_EXECUTOR == "thread":
+        return ThreadPoolExecutor(
+            max_workers=settings.PASSWORD_HASH_WORKERS,
+            thread_name_prefix="password-hash",
+        )
+    raise ValueError(
+        f"Unknown PASSWORD_HASH_EXECUTOR {settings.PASSWORD_HASH_EXECUTOR!r}"
+    )
+
+
+async def hash_password_async(password: str) -> str:
+    "hash_password, run in the password executor"
+    loop = asyncio.get_running_loop()
+    n = get_settings().PASSWORD_HASH_N
+    return await loop.run_in_executor(
+        get_password_executor(), hash_password, password, n
+    )
+
+
+async def verify_password_async(password: str, stored: Optional[str]) -> bool:
+    "verify_password, run in the password executor"
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_password_executor(), verify_password, password, stored
+    )
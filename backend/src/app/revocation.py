@@ -0,0 +1,163 @@
+"""
+In-memory JWT revocation list, kept in sync with the revoked_tokens table.
+
+get_rctx checks every token against this list instead of looking the user up,
+so the check is two dict lookups.  Each process loads the unexpired
+revocations at startup, then polls for new ones every
+REVOCATION_POLL_INTERVAL seconds.  Revocations made in this process apply
+as soon as their session commits.
+"""
+
+import asyncio
+import contextlib
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+import sqlalchemy as sa
+import structlog
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.db import db_session
+from app.models import RevokedTokenDAO
+from app.settings import get_settings
+
+logger = structlog.get_logger(__name__)
+
+# Re-read revocations this far behind the newest one seen, to catch
+# transactions that committed out of created_at order
+LOOKBACK = timedelta(seconds=10)
+# Delete expired rows from the table at most this often, in seconds
+PRUNE_INTERVAL = 300.0
+# Session.info key of revocations to apply in this process once it commits
+PENDING_REVOCATIONS = "pending_revocations"
+
+
+class RevocationList:
+    def __init__(self, poll_interval: float = 5.0) -> None:
+        self.poll_interval = poll_interval
+        # jti -> exp, and user id (as in the user_id claim) -> revoked at,
+        # both as epoch seconds
+        self.tokens: Dict[str, float] = {}
+        self.users: Dict[str, float] = {}
+        self._high_water: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+        self._last_prune = 0.0
+
+    def is_revoked(self, claims: Dict[str, Any]) -> bool:
+        "Whether a token with these (verified) claims has been revoked"
+        if claims.get("jti") in self.tokens:
+            return True
+        revoked_at = self.users.get(claims.get("user_id"))
+        if revoked_at is None or "iat" not in claims:
+            return False
+        # iat is in whole seconds, so a token issued in the same second as the
+        # revocation can't be told apart from one issued just before it, and
+        # is revoked too
+        return claims["iat"] <= revoked_at
+
+    def add(self, row: RevokedTokenDAO, revoked_at: Optional[float] = None) -> None:
+        "Apply a revocation, revoked_at defaults to the row's created_at"
+        if row.jti is not None:
+            self.tokens[row.jti] = row.expires_at.timestamp()
+        if row.user_id is not None:
+            key = str(row.user_id)
+            if revoked_at is None:
+                revoked_at = row.created_at.timestamp()
+            self.users[key] = max(self.users.get(key, 0), revoked_at)
+
+    def revoke(self, session: AsyncSession, claims: Dict[str, Any]) -> None:
+        "Revoke one token, in every process once session commits"
+        exp = datetime.fromtimestamp(claims["exp"], timezone.utc)
+        self._revoke_on_commit(
+            session, RevokedTokenDAO(jti=claims["jti"], expires_at=exp)
+        )
+
+    def revoke_user(self, session: AsyncSession, user_id: uuid.UUID) -> None:
+        "Revoke every token issued to user_id so far, once session commits"
+        self._revoke_on_commit(session, RevokedTokenDAO.for_user(user_id))
+
+    def _revoke_on_commit(self, session: AsyncSession, row: RevokedTokenDAO) -> None:
+        session.add(row)
+        session.sync_session.info.setdefault(PENDING_REVOCATIONS, []).append(
+            (self, row)
+        )
+
+    async def refresh(self) -> int:
+        "Load revocations made since the last refresh, returning how many"
+        async with db_session() as session:
+            if self._high_water is None:
+                results = await session.execute(sa.select(sa.func.now()))
+                now = results.scalar_one()
+                rows = await RevokedTokenDAO.get_active(session)
+            else:
+                now = None
+                rows = await RevokedTokenDAO.get_active(
+                    session, since=self._high_water - LOOKBACK
+                )
+        for row in rows:
+            self.add(row)
+        newest = max((row.created_at for row in rows), default=now)
+        if newest is not None:
+            self._high_water = max(self._high_water or newest, newest)
+
+        # Revocations only matter until the tokens they cover expire
+        cutoff = time.time()
+        self.tokens = {jti: exp for jti, exp in self.tokens.items() if exp > cutoff}
+        cutoff -= get_settings().REFRESH_TOKEN_TTL
+        self.users = {id: at for id, at in self.users.items() if at > cutoff}
+        return len(rows)
+
+    async def prune(self) -> None:
+        "Delete rows for tokens that have expired anyway"
+        self._last_prune = time.monotonic()
+        async with db_session() as session:
+            await RevokedTokenDAO.delete_expired(session)
+
+    async def start(self) -> None:
+        "Load the revocation list and poll for changes, retrying a failed load"
+        try:
+            await self.refresh()
+        except Exception:
+            logger.exception("Loading the revocation list failed")
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.refresh()
+                if time.monotonic() - self._last_prune > PRUNE_INTERVAL:
+                    await self.prune()
+            except Exception:
+                logger.exception("Refreshing the revocation list failed")
+
+
+@lru_cache
+def get_revocation_list() -> RevocationList:
+    "Process-wide revocation list"
+    return RevocationList(poll_interval=get_settings().REVOCATION_POLL_INTERVAL)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending(session: Session):
+    # The row's created_at isn't loaded after the INSERT, commit time is close
+    for revocations, row in session.info.pop(PENDING_REVOCATIONS, ()):
+        revocations.add(row, revoked_at=time.time())
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session: Session):
+    session.info.pop(PENDING_REVOCATIONS, None)
@@ -1,8 +1,16 @@
 import uuid
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, conlist
+
+# Maximum number of items accepted by one /todo/bulk request
+BULK_MAX_ITEMS = 1000
+
+
+class RefreshRequest(BaseModel):
+    "Body of /auth/refresh"
+    refresh_token: str
 
 
 class UserOut(BaseModel):
@@ -38,3 +46,20 @@ class TodoOut(BaseModel):
 
     class Config:
         orm_mode = True
+
+
+class TodoBulkUpdate(TodoUpdate):
+    "One item of a bulk update, optional title/content for the Todo with this id"
+    id: uuid.UUID
+
+
+class TodoBulkResult(BaseModel):
+    "Per-item outcome of a bulk update or delete"
+    id: uuid.UUID
+    status: int
+    todo: Optional[TodoOut]
+
+
+TodoBulkCreateList = conlist(TodoCreate, min_items=1, max_items=BULK_MAX_ITEMS)
+TodoBulkUpdateList = conlist(TodoBulkUpdate, min_items=1, max_items=BULK_MAX_ITEMS)
+TodoBulkDeleteList = conlist(uuid.UUID, min_items=1, max_items=BULK_MAX_ITEMS)
@@ -7,10 +7,74 @@ from pydantic import BaseSettings
 
 class Settings(BaseSettings):
     DB_DSN: str = "cockroachdb+asyncpg://root@cockroach:26257/defaultdb"
+    # Connection pool tuning for the process-wide engine in app.db
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_RECYCLE: int = 3600  # seconds, -1 to disable
+    DB_POOL_PRE_PING: bool = True
+    # Prepared statements asyncpg keeps per connection (LRU), 0 disables
+    DB_PREPARED_STATEMENT_CACHE_SIZE: int = 100
+    # Optional separate DSN (e.g. a read replica / nearby node) for GET requests
+    DB_READ_DSN: Optional[str] = None
+    # Serve GET requests from follower replicas, up to ~5 seconds stale
+    DB_FOLLOWER_READS: bool = False
+    # In-process retries of transactions that hit CockroachDB serialization failures
+    DB_RETRY_MAX_ATTEMPTS: int = 5
+    DB_RETRY_BASE_DELAY: float = 0.01  # seconds
+    DB_RETRY_MAX_DELAY: float = 1.0  # seconds
+    # Log / keep statements slower than this (milliseconds), unset to disable
+    SLOW_QUERY_THRESHOLD_MS: Optional[float] = None
+    SLOW_QUERY_LOG_SIZE: int = 100
+    # Also capture the EXPLAIN plan (which doesn't run the query) of slow
+    # SELECTs, once per statement
+    SLOW_QUERY_EXPLAIN: bool = False
+    # Serve the /debug/* routes, which expose server internals to any
+    # authenticated user.  Off in production.
+    DEBUG_ROUTES: bool = False
     LOG_LEVEL: str = "INFO"
     LOGS_AS_JSON: bool = False
+    # "dev", or "prod" to render JSON on a background thread (QueueHandler /
+    # QueueListener) so logging never blocks the event loop
+    LOG_PROFILE: str = "dev"
+    # Fraction of SQL statements logged by sqlalchemy.engine at INFO.
+    # Unset means every statement for "dev" and none for "prod".
+    SQL_LOG_SAMPLE_RATE: Optional[float] = None
     ROOT_PATH: Optional[str] = None
     SECRET_KEY: str = secrets.token_urlsafe(32)
+    # Build the RequestContext from JWT claims instead of querying the user.
+    # Revoked tokens (app.revocation) are still rejected, but other processes
+    # only see a revocation after REVOCATION_POLL_INTERVAL.
+    AUTH_STATELESS: bool = False
+    ACCESS_TOKEN_TTL: int = 15 * 60  # seconds
+    REFRESH_TOKEN_TTL: int = 7 * 24 * 60 * 60  # seconds
+    # How often each process picks up revocations made by others
+    REVOCATION_POLL_INTERVAL: float = 5.0  # seconds
+    # "jose" (python-jose) or "hmac" (built-in HS256 verifier) for decoding JWTs,
+    # and an in-process cache of verified claims keyed by token (0 disables)
+    JWT_BACKEND: str = "jose"
+    JWT_CACHE_SIZE: int = 10000
+    JWT_CACHE_TTL: float = 300.0  # seconds
+    # In-process cache of UserDAO objects for handlers that need the full user
+    USER_CACHE_SIZE: int = 1024
+    USER_CACHE_TTL: float = 60.0  # seconds
+    # scrypt cost for password hashes (a power of two, ~50ms at 2**14), and the
+    # "thread" or "process" pool hashing runs in so it never blocks the loop
+    PASSWORD_HASH_N: int = 2**14
+    PASSWORD_HASH_EXECUTOR: str = "thread"
+    PASSWORD_HASH_WORKERS: int = 4
+    # Serialize GET /todo from Core rows with app.serializers instead of
+    # through TodoOut.from_orm, the response bytes are the same
+    FAST_SERIALIZER: bool = False
+    # Default number of todos per page for GET /todo
+    TODO_PAGE_SIZE: int = 100
+    # In-process cache of serialized GET /todo responses, keyed by user and
+    # validated against the list's ETag.  0 disables the cache.
+    RESPONSE_CACHE_SIZE: int = 0
+    RESPONSE_CACHE_TTL: float = 60.0  # seconds
+    # How cache invalidations reach other backend processes: "local" (single
+    # process, nothing to share) or "table" (poll the invalidation_events table)
+    INVALIDATION_BUS: str = "local"
+    INVALIDATION_POLL_INTERVAL: float = 1.0  # seconds
 
 
 @lru_cache
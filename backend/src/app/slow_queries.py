@@ -0,0 +1,154 @@
+"""
+Opt-in slow query log, enabled by setting SLOW_QUERY_THRESHOLD_MS.
+
+Statements are timed with engine cursor events.  Any statement slower than
+the threshold is logged and kept in a bounded in-memory list (see the
+/debug/slow-queries route), along with the request that issued it.  Only
+the statement text and the number of parameters are kept, never parameter
+values, since those can be other users' data or password hashes.
+
+With SLOW_QUERY_EXPLAIN, slow SELECTs also get an EXPLAIN plan, captured
+once per statement shape on a separate connection so that it can't
+interfere with the request's own transaction.  Plain EXPLAIN only plans the
+statement, it never runs it again.
+"""
+
+import asyncio
+import dataclasses
+import time
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+import structlog
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+logger = structlog.get_logger(__name__)
+
+# "METHOD /path" of the request being handled, set by app.db.get_session
+current_route: ContextVar[str] = ContextVar("current_route", default="-")
+
+# Stop caching plans once this many distinct statements have been explained
+MAX_CACHED_PLANS = 1000
+
+
+@dataclasses.dataclass
+class SlowQuery:
+    statement: str
+    parameter_count: int
+    route: str
+    duration_ms: float
+    timestamp: datetime
+    plan: Optional[str] = None
+
+
+class SlowQueryLog:
+    def __init__(self) -> None:
+        self.threshold_ms: Optional[float] = None
+        self.explain = False
+        self.entries: Deque[SlowQuery] = deque(maxlen=100)
+        self._plans: Dict[str, str] = {}
+        # Statements with an EXPLAIN in flight, and the tasks running them
+        self._explaining: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        # (event name, listener) pairs added to each attached engine
+        self._listeners: Dict[AsyncEngine, List[Tuple[str, Callable]]] = {}
+
+    def configure(self, threshold_ms: float, maxlen: int, explain: bool) -> None:
+        self.threshold_ms = threshold_ms
+        self.explain = explain
+        self.entries = deque(self.entries, maxlen=maxlen)
+
+    def attach(self, engine: AsyncEngine) -> None:
+        "Time statements run through engine"
+
+        def before_cursor_execute(
+            conn, cursor, statement, parameters, context, executemany
+        ):
+            context._slow_query_start_time = time.perf_counter()
+
+        def after_cursor_execute(
+            conn, cursor, statement, parameters, context, executemany
+        ):
+            duration_ms = (time.perf_counter() - context._slow_query_start_time) * 1000
+            if self.threshold_ms is not None and duration_ms >= self.threshold_ms:
+                if executemany:
+                    parameters = parameters[0] if parameters else ()
+                self.record(engine, statement, parameters, duration_ms)
+
+        listeners = [
+            ("before_cursor_execute", before_cursor_execute),
+            ("after_cursor_execute", after_cursor_execute),
+        ]
+        for name, listener in listeners:
+            event.listen(engine.sync_engine, name, listener)
+        self._listeners[engine] = listeners
+
+    def detach(self, engine: AsyncEngine) -> None:
+        "Stop timing statements run through engine"
+        for name, listener in self._listeners.pop(engine, []):
+            event.remove(engine.sync_engine, name, listener)
+
+    def record(
+        self, engine: AsyncEngine, statement: str, parameters: Any, duration_ms: float
+    ) -> None:
+        if statement.lstrip().upper().startswith("EXPLAIN"):
+            return
+        entry = SlowQuery(
+            statement=statement,
+            parameter_count=len(parameters) if parameters else 0,
+            route=current_route.get(),
+            duration_ms=duration_ms,
+            timestamp=datetime.now(timezone.utc),
+            plan=self._plans.get(statement),
+        )
+        self.entries.append(entry)
+        logger.warning(
+            "Slow query",
+            statement=statement,
+            parameter_count=entry.parameter_count,
+            route=entry.route,
+            duration_ms=round(duration_ms, 3),
+        )
+        is_select = statement.lstrip().upper().startswith("SELECT")
+        if (
+            self.explain
+            and is_select
+            and entry.plan is None
+            and statement not in self._explaining
+        ):
+            self._explaining.add(statement)
+            # Cursor events run on the event loop thread, in the greenlet of
+            # the coroutine that executed the statement.  The parameters are
+            # only needed to plan the statement, they aren't kept.
+            task = asyncio.get_running_loop().create_task(
+                self._explain(engine, entry, parameters)
+            )
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _explain(
+        self, engine: AsyncEngine, entry: SlowQuery, parameters: Any
+    ) -> None:
+        try:
+            async with engine.connect() as conn:
+                results = await conn.exec_driver_sql(
+                    "EXPLAIN " + entry.statement, parameters
+                )
+                entry.plan = "\n".join(str(row[0]) for row in results)
+        except Exception as e:
+            entry.plan = f"EXPLAIN failed: {e}"
+            return
+        finally:
+            self._explaining.discard(entry.statement)
+        if len(self._plans) < MAX_CACHED_PLANS:
+            self._plans[entry.statement] = entry.plan
+
+    def recent(self) -> List[dict]:
+        "Recorded slow queries, newest first"
+        return [dataclasses.asdict(entry) for entry in reversed(self.entries)]
+
+
+slow_query_log = SlowQueryLog()
@@ -0,0 +1,125 @@
+"""
+JWT verification for get_rctx.
+
+The same token is presented on every request a client makes, so verified
+claims are kept in a bounded LRU (JWT_CACHE_SIZE / JWT_CACHE_TTL).  Cache
+hits skip signature checks and JSON parsing, but `exp` and `nbf` are still
+enforced on every call.
+
+JWT_BACKEND picks what verifies a token on a cache miss:
+ - "jose": python-jose's jwt.decode
+ - "hmac": a minimal HS256 verifier with the HMAC key schedule and the
+   expected header precomputed.  It accepts the same tokens as "jose" does
+   with algorithms=["HS256"].
+"""
+
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import time
+from functools import lru_cache
+from typing import Any, Dict
+
+from jose import jwt
+from jose.exceptions import ExpiredSignatureError, JWTClaimsError, JWTError
+
+from app.cache import get_token_cache
+from app.settings import get_settings
+
+ALGORITHM = "HS256"
+
+Claims = Dict[str, Any]
+
+
+def _b64decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def check_time_claims(claims: Claims) -> None:
+    "Raise if the token is expired or not valid yet, like jose's jwt.decode"
+    now = time.time()
+    if "exp" in claims and claims["exp"] < now:
+        raise ExpiredSignatureError("Signature has expired.")
+    if "nbf" in claims and claims["nbf"] > now:
+        raise JWTClaimsError("The token is not yet valid (nbf)")
+
+
+class JoseBackend:
+    def __init__(self, secret: str) -> None:
+        self.secret = secret
+
+    def decode(self, token: str) -> Claims:
+        return jwt.decode(token, self.secret, algorithms=[ALGORITHM])
+
+
+class HMACBackend:
+    "HS256 only, with the key and header precomputed"
+
+    def __init__(self, secret: str) -> None:
+        # HMAC objects are copied per token instead of re-deriving the padded key
+        self._mac = hmac.new(secret.encode(), digestmod=hashlib.sha256)
+        # The header jose (and create_token) writes, matching it skips parsing
+        header = json.dumps({"alg": ALGORITHM, "typ": "JWT"}, separators=(",", ":"))
+        self._header = _b64encode(header.encode())
+
+    def decode(self, token: str) -> Claims:
+        if token.count(".") != 2:
+            raise JWTError("Not enough segments")
+        signing_input, _, signature = token.rpartition(".")
+        header, _, payload = signing_input.partition(".")
+        try:
+            if header != self._header:
+                if json.loads(_b64decode(header)).get("alg") != ALGORITHM:
+                    raise JWTError("The specified alg value is not allowed")
+            mac = self._mac.copy()
+            mac.update(signing_input.encode())
+            if not hmac.compare_digest(mac.digest(), _b64decode(signature)):
+                raise JWTError("Signature verification failed.")
+            claims = json.loads(_b64decode(payload))
+        except (binascii.Error, UnicodeError, ValueError, AttributeError):
+            raise JWTError("Invalid token")
+        if not isinstance(claims, dict):
+            raise JWTError("Invalid payload")
+        check_time_claims(claims)
+        return claims
+
+
+BACKENDS = {"jose": JoseBackend, "hmac": HMACBackend}
+
+
+@lru_cache
+def get_jwt_backend():
+    "Process-wide JWT backend chosen by JWT_BACKEND"
+    settings = get_settings()
+    try:
+        backend = BACKENDS[settings.JWT_BACKEND]
+    except KeyError:
+        raise ValueError(f"Unknown JWT_BACKEND {settings.JWT_BACKEND!r}")
+    return backend(settings.SECRET_KEY)
+
+
+def decode_token(token: str) -> Claims:
+    """
+    Verify token and return its claims, raising JWTError if it's invalid or
+    expired.  The returned dict may be shared with other callers, don't
+    modify it.
+    """
+    cache = get_token_cache() if get_settings().JWT_CACHE_SIZE else None
+    claims = cache.get(token) if cache is not None else None
+    if claims is None:
+        claims = get_jwt_backend().decode(token)
+        if cache is not None:
+            cache.set(token, claims)
+        return claims
+    try:
+        check_time_claims(claims)
+    except JWTError:
+        cache.invalidate(token)
+        raise
+    return claims
@@ -0,0 +1,10 @@
+"""
+gunicorn worker class for production, see gunicorn.conf.py.
+"""
+
+from uvicorn.workers import UvicornWorker as BaseUvicornWorker
+
+
+class UvicornWorker(BaseUvicornWorker):
+    "uvicorn worker that requires uvloop and httptools instead of falling back"
+    CONFIG_KWARGS = {"loop": "uvloop", "http": "httptools", "lifespan": "on"}
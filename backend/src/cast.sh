@@ -8,4 +8,13 @@ if [[ -n "$RUN_ALEMBIC" ]]; then
     poetry run alembic upgrade head 
 fi
 
+if [[ "$SERVER_MODE" == "production" ]]; then
+    # gunicorn supervising uvicorn workers, see gunicorn.conf.py.  exec so that
+    # tini's SIGTERM reaches gunicorn and in-flight requests are drained.
+    unset PYTHONASYNCIODEBUG
+    export LOG_PROFILE="${LOG_PROFILE:-prod}"
+    exec poetry run gunicorn app.main:app --config gunicorn.conf.py
+fi
+
+export PYTHONASYNCIODEBUG=1
 poetry run python -m debugpy --listen 0.0.0.0:5678 -m uvicorn app.main:app --reload --host 0.0.0.0
@@ -0,0 +1,24 @@
+"""
+gunicorn settings for SERVER_MODE=production (see cast.sh).
+
+Every worker imports app.main itself (no preload_app), so each one gets its
+own event loop, database engine and connection pool from the app's startup
+hook.  Nothing that holds sockets or threads is created before the fork.
+
+On SIGTERM gunicorn stops accepting connections and each worker finishes its
+in-flight requests, then runs the app's shutdown hook, for up to
+GRACEFUL_TIMEOUT seconds before being killed.
+"""
+
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+# One worker per CPU available to the container, async workers don't need more
+workers = int(os.environ.get("WEB_CONCURRENCY", len(os.sched_getaffinity(0))))
+worker_class = "app.workers.UvicornWorker"
+preload_app = False
+graceful_timeout = int(os.environ.get("GRACEFUL_TIMEOUT", 30))
+timeout = int(os.environ.get("WORKER_TIMEOUT", 60))
+keepalive = 5
+# Request counts and latencies come from MetricsMiddleware instead
+accesslog = None
@@ -0,0 +1,32 @@
+"""add todo updated_at
+
+Revision ID: 0.3.0
+Revises: 0.2.1
+Create Date: 2026-10-18 09:30:00.000000
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0.3.0"
+down_revision = "0.2.1"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing rows get the time of the migration
+    op.add_column(
+        "todo",
+        sa.Column(
+            "updated_at",
+            sa.TIMESTAMP(timezone=True),
+            server_default=sa.func.now(),
+            nullable=False,
+        ),
+    )
+
+
+def downgrade():
+    op.drop_column("todo", "updated_at")
@@ -0,0 +1,39 @@
+"""add invalidation_events
+
+Revision ID: 0.4.0
+Revises: 0.3.0
+Create Date: 2026-10-18 10:15:00.000000
+
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "0.4.0"
+down_revision = "0.3.0"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "invalidation_events",
+        sa.Column("id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("created_at", sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column("channel", sa.String(), nullable=False),
+        sa.Column("key", sa.String(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_invalidation_events_id"), "invalidation_events", ["id"], unique=True
+    )
+    op.create_index(
+        "ix_invalidation_events_created_at", "invalidation_events", ["created_at"]
+    )
+
+
+def downgrade():
+    op.drop_index("ix_invalidation_events_created_at", table_name="invalidation_events")
+    op.drop_index(op.f("ix_invalidation_events_id"), table_name="invalidation_events")
+    op.drop_table("invalidation_events")
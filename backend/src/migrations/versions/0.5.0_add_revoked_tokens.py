@@ -0,0 +1,38 @@
+"""add revoked_tokens
+
+Revision ID: 0.5.0
+Revises: 0.4.0
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "0.5.0"
+down_revision = "0.4.0"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "revoked_tokens",
+        sa.Column("id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("created_at", sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column("jti", sa.String(), nullable=True),
+        sa.Column("user_id", postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column("expires_at", sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_revoked_tokens_id"), "revoked_tokens", ["id"], unique=True)
+    op.create_index("ix_revoked_tokens_created_at", "revoked_tokens", ["created_at"])
+    op.create_index("ix_revoked_tokens_expires_at", "revoked_tokens", ["expires_at"])
+
+
+def downgrade():
+    op.drop_index("ix_revoked_tokens_expires_at", table_name="revoked_tokens")
+    op.drop_index("ix_revoked_tokens_created_at", table_name="revoked_tokens")
+    op.drop_index(op.f("ix_revoked_tokens_id"), table_name="revoked_tokens")
+    op.drop_table("revoked_tokens")
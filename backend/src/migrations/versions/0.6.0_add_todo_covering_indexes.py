@@ -0,0 +1,40 @@
+"""add covering todo indexes
+
+Revision ID: 0.6.0
+Revises: 0.5.0
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0.6.0"
+down_revision = "0.5.0"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # INCLUDE is CockroachDB's STORING, these serve list queries index-only
+    op.create_index(
+        "ix_todo_user_id_created_at_id",
+        "todo",
+        ["user_id", "created_at", "id"],
+        postgresql_include=["title", "content", "space_id", "updated_at"],
+    )
+    op.create_index(
+        "ix_todo_space_id_created_at_id",
+        "todo",
+        ["space_id", "created_at", "id"],
+        postgresql_include=["title", "content", "user_id", "updated_at"],
+    )
+    # Prefixes of the indexes above, only slowing down writes now
+    op.drop_index("ix_todo_user_id", table_name="todo")
+    op.drop_index("ix_todo_space_id", table_name="todo")
+
+
+def downgrade():
+    op.create_index("ix_todo_space_id", "todo", ["space_id"], unique=False)
+    op.create_index("ix_todo_user_id", "todo", ["user_id"], unique=False)
+    op.drop_index("ix_todo_space_id_created_at_id", table_name="todo")
+    op.drop_index("ix_todo_user_id_created_at_id", table_name="todo")
@@ -0,0 +1,29 @@
+"""add hash-sharded todo created_at index
+
+Revision ID: 0.7.0
+Revises: 0.6.0
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0.7.0"
+down_revision = "0.6.0"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Always on from CockroachDB 22.1
+    op.execute("SET experimental_enable_hash_sharded_indexes = on")
+    # Every insert would land at the end of an ordered created_at index,
+    # spread them over 16 ranges instead (see app.models.hash_sharded_index)
+    op.execute(
+        "CREATE INDEX ix_todo_created_at ON todo (created_at) "
+        "USING HASH WITH BUCKET_COUNT = 16"
+    )
+
+
+def downgrade():
+    op.drop_index("ix_todo_created_at", table_name="todo")
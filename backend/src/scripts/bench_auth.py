@@ -0,0 +1,69 @@
+"""
+Micro-benchmark of per-request JWT verification cost.
+
+Times verifying one token over and over with each JWT backend, then
+decode_token and get_rctx in AUTH_STATELESS mode (the whole dependency, which
+never awaits anything in that mode) with and without the verified-claims
+cache.  Reports microseconds per call.
+No database is needed.  Run from backend/src:
+
+    poetry run python -m scripts.bench_auth [--n 20000]
+"""
+
+import argparse
+import json
+import time
+import uuid
+
+from app.auth import create_token, get_rctx
+from app.cache import get_token_cache
+from app.settings import get_settings
+from app.tokens import BACKENDS, decode_token, get_jwt_backend
+
+
+def run_sync(coro):
+    "Run a coroutine that never suspends, without event loop overhead"
+    try:
+        coro.send(None)
+    except StopIteration as e:
+        return e.value
+    raise RuntimeError("coroutine suspended")
+
+
+def per_call_us(func, n: int) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        func()
+    return round((time.perf_counter() - start) / n * 1e6, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=20000)
+    args = parser.parse_args()
+
+    settings = get_settings()
+    settings.AUTH_STATELESS = True
+    token = create_token(uuid.uuid4(), name="bench", organization_id=uuid.uuid4())
+
+    results = {}
+    for name in BACKENDS:
+        settings.JWT_BACKEND = name
+        get_jwt_backend.cache_clear()
+        backend = get_jwt_backend()
+        results[f"{name} decode"] = per_call_us(lambda: backend.decode(token), args.n)
+        for cache_size in (0, 10000):
+            settings.JWT_CACHE_SIZE = cache_size
+            get_token_cache.cache_clear()
+            label = "cached" if cache_size else "uncached"
+            results[f"{name} decode_token {label}"] = per_call_us(
+                lambda: decode_token(token), args.n
+            )
+            results[f"{name} get_rctx {label}"] = per_call_us(
+                lambda: run_sync(get_rctx(token=token, session=None)), args.n
+            )
+    print(json.dumps({"us_per_call": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
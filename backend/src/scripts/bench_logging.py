@@ -0,0 +1,74 @@
+"""
+Micro-benchmark of logging cost on the calling (event loop) thread.
+
+Emits a mix of structlog events and SQLAlchemy-style statement records under
+each logging profile and reports calls per second.  Output is sent to
+/dev/null so the numbers reflect formatting / handler overhead, not terminal
+speed.  "caller" is the rate seen by the thread doing the logging, "total"
+also waits for the "prod" background thread to drain its queue.
+Run from backend/src:
+
+    poetry run python -m scripts.bench_logging [--n 20000]
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+import structlog
+
+from app.log_utils import setup_logging, stop_queue_listener
+from app.settings import Settings
+
+PROFILES = {
+    "off": dict(LOG_LEVEL="CRITICAL", SQL_LOG_SAMPLE_RATE=0),
+    "dev-console": dict(LOG_PROFILE="dev"),
+    "dev-json": dict(LOG_PROFILE="dev", LOGS_AS_JSON=True),
+    "prod": dict(LOG_PROFILE="prod", LOGS_AS_JSON=True),
+    "prod-sql-sampled": dict(
+        LOG_PROFILE="prod", LOGS_AS_JSON=True, SQL_LOG_SAMPLE_RATE=0.01
+    ),
+}
+
+
+def emit(n: int):
+    logger = structlog.get_logger("bench")
+    sql_logger = logging.getLogger("sqlalchemy.engine.Engine")
+    for i in range(n):
+        logger.info("request handled", route="/todo/{id}", status=200, i=i)
+        if sql_logger.isEnabledFor(logging.INFO):
+            sql_logger.info("SELECT todo.id FROM todo WHERE todo.id = %s", "abc")
+            sql_logger.info("[cached since %.4gs ago] %r", 1.5, ("abc",))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=20000)
+    args = parser.parse_args()
+
+    results = {}
+    real_stderr = sys.stderr
+    with open(os.devnull, "w") as devnull:
+        for name, overrides in PROFILES.items():
+            # setup_logging's StreamHandler binds sys.stderr when it's created
+            sys.stderr = devnull
+            try:
+                setup_logging(Settings(**overrides))
+                start = time.perf_counter()
+                emit(args.n)
+                caller = time.perf_counter() - start
+                stop_queue_listener()
+                total = time.perf_counter() - start
+            finally:
+                sys.stderr = real_stderr
+            results[name] = {
+                "caller_per_sec": round(args.n / caller),
+                "total_per_sec": round(args.n / total),
+            }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Event loop latency during a login storm.
+
+A heartbeat coroutine sleeps HEARTBEAT seconds in a loop and records how late
+it wakes up, while `--logins` password verifications run concurrently, first
+inline on the event loop and then through app.passwords' executor.  Inline,
+every other coroutine on the worker stalls for the whole storm, with the
+executor the heartbeat lag should stay flat.  No database is needed.
+Run from backend/src:
+
+    poetry run python -m scripts.bench_password_hashing [--logins 50]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from app.passwords import hash_password, verify_password, verify_password_async
+from app.settings import get_settings
+
+HEARTBEAT = 0.005
+
+
+async def heartbeat(lags: list, stop: asyncio.Event):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(HEARTBEAT)
+        lags.append(time.perf_counter() - start - HEARTBEAT)
+
+
+async def storm(mode: str, logins: int, stored: str) -> dict:
+    lags = []
+    stop = asyncio.Event()
+    beat = asyncio.create_task(heartbeat(lags, stop))
+    await asyncio.sleep(HEARTBEAT * 4)
+
+    async def login():
+        if mode == "inline":
+            verify_password("password", stored)
+        else:
+            await verify_password_async("password", stored)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await beat
+
+    lags.sort()
+    return {
+        "logins_per_second": round(logins / elapsed, 1),
+        "heartbeats": len(lags),
+        "loop_lag_ms": {
+            "p50": round(lags[len(lags) // 2] * 1000, 2),
+            "p99": round(lags[int(len(lags) * 0.99)] * 1000, 2),
+            "max": round(lags[-1] * 1000, 2),
+        },
+    }
+
+
+async def main(logins: int):
+    settings = get_settings()
+    stored = hash_password("password", settings.PASSWORD_HASH_N)
+    results = {
+        "settings": {
+            "PASSWORD_HASH_N": settings.PASSWORD_HASH_N,
+            "PASSWORD_HASH_EXECUTOR": settings.PASSWORD_HASH_EXECUTOR,
+            "PASSWORD_HASH_WORKERS": settings.PASSWORD_HASH_WORKERS,
+        }
+    }
+    for mode in ("inline", "executor"):
+        results[mode] = await storm(mode, logins, stored)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.logins))
@@ -0,0 +1,323 @@
+"""
+Load generator for the minor-illusion API.
+
+Runs a number of virtual users, each logging in as one of the seed users and
+then looping over a weighted mix of requests (/me, list, create, update and
+delete todos) with some think time in between, until the test duration is up.
+Virtual users are started evenly over the ramp-up period.  Prints a JSON
+report with throughput, latency percentiles and error rates per action.
+
+By default the app is run in-process from main.build_app() through httpx's
+ASGI transport, so no network, uvicorn, or Docker is involved (a database is
+still needed, configured with DB_DSN as usual).  Pass --base-url to load test
+a running server instead.  Run from backend/src:
+
+    poetry run python -m scripts.load_test --users 20 --duration 30
+    poetry run python -m scripts.load_test --base-url http://backend:8000
+"""
+
+import argparse
+import asyncio
+import dataclasses
+import json
+import math
+import random
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence
+
+import httpx
+
+DEFAULT_WEIGHTS = {"me": 2, "list": 4, "create": 2, "update": 1, "delete": 1}
+
+
+@dataclasses.dataclass
+class LoadTestConfig:
+    users: int = 10
+    duration: float = 30.0
+    ramp_up: float = 5.0
+    # Mean pause between a virtual user's requests, in seconds
+    think_time: float = 0.1
+    weights: Dict[str, float] = dataclasses.field(
+        default_factory=lambda: dict(DEFAULT_WEIGHTS)
+    )
+    # Seed users (see the 0.2.1 migration) that virtual users log in as
+    accounts: Sequence[str] = ("user1",)
+    password: str = "pass"
+    # Space to create todos in, by default the space of the account's
+    # existing todos (only user1 has seed todos)
+    space_id: Optional[str] = None
+    base_url: Optional[str] = None
+    seed: Optional[int] = None
+
+
+class Stats:
+    "Latencies and errors per action"
+
+    def __init__(self) -> None:
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def record(self, action: str, latency: float, ok: bool) -> None:
+        self.latencies[action].append(latency)
+        if not ok:
+            self.errors[action] += 1
+
+    def report(self, elapsed: float) -> dict:
+        actions = {
+            action: self._summary(latencies, self.errors[action], elapsed)
+            for action, latencies in sorted(self.latencies.items())
+        }
+        everything = [x for latencies in self.latencies.values() for x in latencies]
+        total = self._summary(everything, sum(self.errors.values()), elapsed)
+        return {"elapsed_seconds": round(elapsed, 3), "total": total, **actions}
+
+    @staticmethod
+    def _summary(latencies: List[float], errors: int, elapsed: float) -> dict:
+        count = len(latencies)
+        ordered = sorted(latencies)
+        summary = {
+            "requests": count,
+            "errors": errors,
+            "error_rate": round(errors / count, 4) if count else 0.0,
+            "throughput_rps": round(count / elapsed, 2) if elapsed else 0.0,
+        }
+        if ordered:
+            ms = {
+                "mean": sum(ordered) / count,
+                "p50": percentile(ordered, 50),
+                "p90": percentile(ordered, 90),
+                "p95": percentile(ordered, 95),
+                "p99": percentile(ordered, 99),
+                "max": ordered[-1],
+            }
+            summary["latency_ms"] = {k: round(v * 1000, 3) for k, v in ms.items()}
+        return summary
+
+
+def percentile(ordered: List[float], pct: float) -> float:
+    "Nearest-rank percentile of an already sorted list"
+    rank = max(math.ceil(pct / 100 * len(ordered)) - 1, 0)
+    return ordered[rank]
+
+
+class User:
+    "A virtual user, as in the old 'Stress test API' notebook, recording stats"
+
+    def __init__(
+        self,
+        name: str,
+        client: httpx.AsyncClient,
+        stats: Stats,
+        space_id: Optional[str] = None,
+    ):
+        self.name = name
+        self.client = client
+        self.stats = stats
+        self.space_id = space_id
+        self.todo_ids: List[str] = []
+
+    async def request(self, action: str, method: str, url: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            resp = await self.client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.stats.record(action, time.perf_counter() - start, ok=False)
+            return None
+        self.stats.record(action, time.perf_counter() - start, ok=not resp.is_error)
+        return resp
+
+    async def login(self, password: str) -> bool:
+        data = {"username": self.name, "password": password}
+        resp = await self.request("login", "POST", "/auth/login", data=data)
+        if resp is None or resp.is_error:
+            return False
+        body = resp.json()
+        self.client.headers["Authorization"] = (
+            f"{body['token_type']} {body['access_token']}"
+        )
+        if self.space_id is None:
+            resp = await self.client.get("/todo/", params={"limit": 1})
+            todos = resp.json() if resp.is_success else []
+            if not todos:
+                raise RuntimeError(
+                    f"{self.name} has no todos to take a space from, pass a space_id"
+                )
+            self.space_id = todos[0]["space_id"]
+        return True
+
+    async def me(self):
+        await self.request("me", "GET", "/me")
+
+    async def get_todos(self):
+        await self.request("list", "GET", "/todo/")
+
+    async def make_todo(self):
+        data = {
+            "title": f"load test {self.name}",
+            "content": "made by load_test",
+            "space_id": self.space_id,
+        }
+        resp = await self.request("create", "POST", "/todo/", json=data)
+        if resp is not None and not resp.is_error:
+            self.todo_ids.append(resp.json()["id"])
+
+    async def update_todo(self):
+        if not self.todo_ids:
+            return await self.make_todo()
+        todo_id = random.choice(self.todo_ids)
+        data = {"content": f"updated at {time.time()}"}
+        await self.request("update", "PUT", f"/todo/{todo_id}", json=data)
+
+    async def delete_todo(self):
+        if not self.todo_ids:
+            return await self.make_todo()
+        todo_id = self.todo_ids.pop(random.randrange(len(self.todo_ids)))
+        await self.request("delete", "DELETE", f"/todo/{todo_id}")
+
+    async def cleanup(self):
+        "Delete todos this user created that are still around"
+        for todo_id in self.todo_ids:
+            await self.client.delete(f"/todo/{todo_id}")
+        self.todo_ids.clear()
+
+    def __repr__(self):
+        return f"<User {self.name}>"
+
+
+ACTIONS = {
+    "me": User.me,
+    "list": User.get_todos,
+    "create": User.make_todo,
+    "update": User.update_todo,
+    "delete": User.delete_todo,
+}
+
+
+async def virtual_user(
+    user: User, config: LoadTestConfig, start_delay: float, deadline: float
+) -> None:
+    await asyncio.sleep(start_delay)
+    if not await user.login(config.password):
+        return
+    names = list(config.weights)
+    weights = [config.weights[name] for name in names]
+    while time.perf_counter() < deadline:
+        action = random.choices(names, weights)[0]
+        await ACTIONS[action](user)
+        if config.think_time:
+            await asyncio.sleep(random.uniform(0, 2 * config.think_time))
+    await user.cleanup()
+
+
+async def run_load_test(config: LoadTestConfig) -> dict:
+    "Run a load test and return the report"
+    unknown = set(config.weights) - set(ACTIONS)
+    if unknown:
+        raise ValueError(f"Unknown actions: {', '.join(sorted(unknown))}")
+    if config.seed is not None:
+        random.seed(config.seed)
+
+    if config.base_url:
+        base_url = config.base_url
+        transport = None
+    else:
+        from app.db import dispose_engine, init_engine
+        from app.main import build_app
+
+        base_url = "http://load-test"
+        transport = httpx.ASGITransport(app=build_app())
+        init_engine()
+
+    stats = Stats()
+    clients = [
+        httpx.AsyncClient(
+            base_url=base_url, transport=transport, timeout=30, follow_redirects=True
+        )
+        for _ in range(config.users)
+    ]
+    users = [
+        User(config.accounts[i % len(config.accounts)], client, stats, config.space_id)
+        for i, client in enumerate(clients)
+    ]
+    start = time.perf_counter()
+    deadline = start + config.ramp_up + config.duration
+    try:
+        await asyncio.gather(
+            *(
+                virtual_user(user, config, i * config.ramp_up / config.users, deadline)
+                for i, user in enumerate(users)
+            )
+        )
+    finally:
+        elapsed = time.perf_counter() - start
+        for client in clients:
+            await client.aclose()
+        if transport is not None:
+            await dispose_engine()
+
+    report = stats.report(elapsed)
+    report["config"] = dataclasses.asdict(config)
+    return report
+
+
+def parse_weights(value: str) -> Dict[str, float]:
+    "Parse 'me=2,list=4,...' into a weights dict"
+    weights = {}
+    for pair in value.split(","):
+        name, _, weight = pair.partition("=")
+        weights[name.strip()] = float(weight)
+    return weights
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=10, help="virtual users")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds")
+    parser.add_argument("--ramp-up", type=float, default=5.0, help="seconds")
+    parser.add_argument("--think-time", type=float, default=0.1, help="seconds")
+    parser.add_argument(
+        "--weights",
+        type=parse_weights,
+        default=dict(DEFAULT_WEIGHTS),
+        help="request mix, e.g. me=2,list=4,create=2,update=1,delete=1",
+    )
+    parser.add_argument(
+        "--accounts",
+        default="user1",
+        help="comma separated seed users to log in as",
+    )
+    parser.add_argument("--password", default="pass")
+    parser.add_argument(
+        "--space-id", help="space to create todos in, for accounts with no todos"
+    )
+    parser.add_argument(
+        "--base-url", help="load test a running server instead of in-process"
+    )
+    parser.add_argument("--seed", type=int, help="random seed")
+    parser.add_argument("--output", help="write the JSON report here, not stdout")
+    args = parser.parse_args()
+
+    config = LoadTestConfig(
+        users=args.users,
+        duration=args.duration,
+        ramp_up=args.ramp_up,
+        think_time=args.think_time,
+        weights=args.weights,
+        accounts=args.accounts.split(","),
+        password=args.password,
+        space_id=args.space_id,
+        base_url=args.base_url,
+        seed=args.seed,
+    )
+    report = asyncio.run(run_load_test(config))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
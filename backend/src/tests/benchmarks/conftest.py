@@ -0,0 +1,95 @@
+"""
+Fixtures for the benchmark suite.  The CockroachDB, settings, seed data, app,
+and client fixtures are shared with the live_db_tests, see tests/conftest.py.
+
+pytest-benchmark times plain functions, so the `aio_benchmark` fixture wraps
+it to run coroutines to completion on the session event loop.
+"""
+
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+import faker
+import httpx
+import pytest
+import sqlalchemy as sa
+from app.auth import create_token
+from app.db import db_session
+from app.models import TodoDAO, UserDAO
+from fastapi import FastAPI
+from tests.conftest import SeedData
+
+# Todos are inserted in batches this size when building the fixtures below
+INSERT_BATCH_SIZE = 1000
+
+
+class AsyncBenchmark:
+    "pytest-benchmark's benchmark fixture, for coroutine functions"
+
+    def __init__(self, benchmark, loop: asyncio.AbstractEventLoop):
+        self.benchmark = benchmark
+        self.loop = loop
+
+    def __call__(self, func: Callable[..., Awaitable], *args, **kwargs) -> Any:
+        return self.benchmark(
+            lambda: self.loop.run_until_complete(func(*args, **kwargs))
+        )
+
+    def pedantic(
+        self,
+        func: Callable[..., Awaitable],
+        setup: Optional[Callable[[], Awaitable[Tuple[tuple, dict]]]] = None,
+        rounds: int = 100,
+    ) -> Any:
+        "Benchmark func, awaiting setup() for fresh (args, kwargs) before each round"
+        return self.benchmark.pedantic(
+            lambda *args, **kwargs: self.loop.run_until_complete(func(*args, **kwargs)),
+            setup=(lambda: self.loop.run_until_complete(setup())) if setup else None,
+            rounds=rounds,
+        )
+
+
+@pytest.fixture
+def aio_benchmark(benchmark, event_loop: asyncio.AbstractEventLoop) -> AsyncBenchmark:
+    return AsyncBenchmark(benchmark, event_loop)
+
+
+@pytest.fixture(
+    scope="session", params=[10, 1_000, 100_000], ids=lambda n: f"{n}_todos"
+)
+async def user_with_todos(request, seed_data: SeedData) -> UserDAO:
+    "A user owning request.param todos, deleted at the end of the session"
+    n = request.param
+    async with db_session() as session:
+        user_data = {
+            "name": f"bench_{os.getpid()}_{n}",
+            "password": faker.Faker().password(),
+            "organization_id": seed_data.org.id,
+        }
+        user = await UserDAO.create(session=session, api_model=user_data)
+    todo_data = {"title": "benchmark", "content": "benchmark", "user_id": user.id}
+    for start in range(0, n, INSERT_BATCH_SIZE):
+        count = min(INSERT_BATCH_SIZE, n - start)
+        async with db_session() as session:
+            await TodoDAO.bulk_create(session, [todo_data] * count)
+    yield user
+    async with db_session() as session:
+        await session.execute(sa.delete(TodoDAO).where(TodoDAO.user_id == user.id))
+        await UserDAO.delete(session=session, id=user.id)
+
+
+@pytest.fixture
+async def authed_client(app: FastAPI, seed_data: SeedData) -> httpx.AsyncClient:
+    """
+    Client with a real JWT for the seed user, so that requests go through
+    get_rctx instead of the dependency override the correctness tests use.
+    """
+    token = create_token(seed_data.user.id)
+    async with httpx.AsyncClient(
+        app=app,
+        base_url="http://test",
+        follow_redirects=True,
+        headers={"Authorization": f"bearer {token}"},
+    ) as client:
+        yield client
@@ -0,0 +1,159 @@
+import uuid
+
+import faker
+import pytest
+import sqlalchemy as sa
+from app.auth import create_token, get_rctx
+from app.db import db_session, dispose_engine
+from app.models import TodoDAO, UserDAO
+from app.schemas import TodoOut
+from tests.benchmarks.conftest import AsyncBenchmark
+from tests.conftest import SeedData, SettingsOverride
+
+
+class TestTodoDAOBenchmarks:
+    def test_create(self, aio_benchmark: AsyncBenchmark, seed_data: SeedData):
+        created = []
+
+        async def create():
+            async with db_session() as session:
+                todo_data = {
+                    "title": faker.Faker().text(),
+                    "content": faker.Faker().sentence(),
+                    "user_id": seed_data.user.id,
+                }
+                todo = await TodoDAO.create(session, todo_data)
+            created.append(todo.id)
+
+        aio_benchmark(create)
+
+        async def cleanup():
+            async with db_session() as session:
+                await TodoDAO.bulk_delete(session, created)
+
+        aio_benchmark.loop.run_until_complete(cleanup())
+
+    def test_get(self, aio_benchmark: AsyncBenchmark, tmp_todo: TodoDAO):
+        async def get():
+            async with db_session() as session:
+                return await TodoDAO.get(session, tmp_todo.id)
+
+        todo = aio_benchmark(get)
+        assert todo.id == tmp_todo.id
+
+    def test_get_missing(self, aio_benchmark: AsyncBenchmark):
+        async def get():
+            async with db_session() as session:
+                return await TodoDAO.get(session, uuid.uuid4())
+
+        assert aio_benchmark(get) is None
+
+    def test_get_todos_by_username(
+        self, aio_benchmark: AsyncBenchmark, user_with_todos: UserDAO
+    ):
+        async def get_todos():
+            async with db_session() as session:
+                return await TodoDAO.get_todos_by_username(
+                    session, user_with_todos.name
+                )
+
+        todos = aio_benchmark(get_todos)
+        assert len(todos) > 0
+
+    def test_get_todo_rows_by_username(
+        self, aio_benchmark: AsyncBenchmark, user_with_todos: UserDAO
+    ):
+        "The same query through the Core read path, compare with the above"
+
+        async def get_rows():
+            async with db_session() as session:
+                return await TodoDAO.get_todo_rows_by_username(
+                    session, user_with_todos.name, TodoOut
+                )
+
+        rows = aio_benchmark(get_rows)
+        assert len(rows) > 0
+
+
+@pytest.fixture(params=[0, 100], ids=lambda n: f"prepared_cache_{n}")
+def prepared_statement_cache(request, override_settings: SettingsOverride, event_loop):
+    "Run a benchmark on a fresh engine with each prepared statement cache size"
+    override_settings(DB_PREPARED_STATEMENT_CACHE_SIZE=request.param)
+    event_loop.run_until_complete(dispose_engine())
+    yield request.param
+    override_settings.restore()
+    event_loop.run_until_complete(dispose_engine())
+
+
+class TestStatementCacheBenchmarks:
+    """
+    Per-call overhead of DAO statements.  Passing `options` makes the query
+    methods build a fresh statement, as they all did before statements were
+    cached on BaseDAO, so the *_fresh_statement benchmarks are the baseline.
+    """
+
+    def test_build_fresh_statement(self, benchmark):
+        def build():
+            statement = sa.select(UserDAO).where(UserDAO.name == "user1")
+            return UserDAO._with_load_options(statement)._generate_cache_key()
+
+        benchmark(build)
+
+    def test_build_cached_statement(self, benchmark):
+        def build():
+            statement = UserDAO._statement(
+                "get_user_by_name",
+                lambda: sa.select(UserDAO).where(UserDAO.name == sa.bindparam("name")),
+            )
+            return statement._generate_cache_key()
+
+        benchmark(build)
+
+    @pytest.mark.usefixtures("prepared_statement_cache")
+    def test_get_user_by_name_fresh_statement(
+        self, aio_benchmark: AsyncBenchmark, seed_data: SeedData
+    ):
+        async def get():
+            async with db_session() as session:
+                return await UserDAO.get_user_by_name(
+                    session, seed_data.user.name, options=()
+                )
+
+        assert aio_benchmark(get).id == seed_data.user.id
+
+    @pytest.mark.usefixtures("prepared_statement_cache")
+    def test_get_user_by_name(self, aio_benchmark: AsyncBenchmark, seed_data: SeedData):
+        async def get():
+            async with db_session() as session:
+                return await UserDAO.get_user_by_name(session, seed_data.user.name)
+
+        assert aio_benchmark(get).id == seed_data.user.id
+
+    @pytest.mark.usefixtures("prepared_statement_cache")
+    def test_get_fresh_statement(
+        self, aio_benchmark: AsyncBenchmark, tmp_todo: TodoDAO
+    ):
+        async def get():
+            async with db_session() as session:
+                return await TodoDAO.get(session, tmp_todo.id, options=())
+
+        assert aio_benchmark(get).id == tmp_todo.id
+
+    @pytest.mark.usefixtures("prepared_statement_cache")
+    def test_get(self, aio_benchmark: AsyncBenchmark, tmp_todo: TodoDAO):
+        async def get():
+            async with db_session() as session:
+                return await TodoDAO.get(session, tmp_todo.id)
+
+        assert aio_benchmark(get).id == tmp_todo.id
+
+
+class TestAuthBenchmarks:
+    def test_get_rctx(self, aio_benchmark: AsyncBenchmark, seed_data: SeedData):
+        token = create_token(seed_data.user.id)
+
+        async def rctx():
+            async with db_session() as session:
+                return await get_rctx(token=token, session=session)
+
+        assert aio_benchmark(rctx).user.id == seed_data.user.id
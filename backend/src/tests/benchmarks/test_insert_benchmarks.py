@@ -0,0 +1,113 @@
+"""
+Insert throughput into a todo-shaped table with an ordered index on
+created_at, against the same table with a hash-sharded one, as TodoDAO has
+(see app.models.hash_sharded_index).
+
+Each round inserts ROWS_PER_ROUND rows, one per transaction like POST /todo,
+from 1, 16, or 64 concurrent connections.  Rows per second are saved in each
+benchmark's extra_info.  On a single node, like the in-memory test cluster,
+this shows the cost of sharding.  The benefit, writes spread over many
+ranges and nodes, only shows up on a multi-node cluster (point DB_DSN at one).
+"""
+
+import asyncio
+import uuid
+
+import pytest
+import sqlalchemy as sa
+from app.models import hash_sharded_index
+from app.settings import Settings
+from sqlalchemy.dialects.postgresql import UUID as PostgresUUID
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from tests.benchmarks.conftest import AsyncBenchmark
+
+ROWS_PER_ROUND = 640
+MAX_CONCURRENCY = 64
+
+metadata = sa.MetaData()
+
+
+def todo_table(name: str, sharded: bool) -> sa.Table:
+    "Same columns as todo, without the foreign keys and covering indexes"
+    index_name = f"ix_{name}_created_at"
+    return sa.Table(
+        name,
+        metadata,
+        sa.Column("id", PostgresUUID(as_uuid=True), primary_key=True),
+        sa.Column(
+            "created_at",
+            sa.TIMESTAMP(timezone=True),
+            server_default=sa.func.now(),
+            nullable=False,
+        ),
+        sa.Column(
+            "updated_at",
+            sa.TIMESTAMP(timezone=True),
+            server_default=sa.func.now(),
+            nullable=False,
+        ),
+        sa.Column("title", sa.String),
+        sa.Column("content", sa.String),
+        sa.Column("user_id", PostgresUUID(as_uuid=True)),
+        sa.Column("space_id", PostgresUUID(as_uuid=True)),
+        (
+            hash_sharded_index(index_name, "created_at")
+            if sharded
+            else sa.Index(index_name, "created_at")
+        ),
+    )
+
+
+TABLES = {
+    "ordered": todo_table("bench_todo_ordered", sharded=False),
+    "sharded": todo_table("bench_todo_sharded", sharded=True),
+}
+
+
+@pytest.fixture(scope="module")
+async def insert_engine(test_settings: Settings) -> AsyncEngine:
+    "Engine with a connection per concurrent inserter, and the scratch tables"
+    engine = create_async_engine(
+        test_settings.DB_DSN, pool_size=MAX_CONCURRENCY, max_overflow=0
+    )
+    async with engine.begin() as conn:
+        await conn.exec_driver_sql("SET experimental_enable_hash_sharded_indexes = on")
+        await conn.run_sync(metadata.create_all)
+    yield engine
+    async with engine.begin() as conn:
+        await conn.run_sync(metadata.drop_all)
+    await engine.dispose()
+
+
+@pytest.mark.parametrize("concurrency", [1, 16, 64])
+@pytest.mark.parametrize("index", list(TABLES))
+def test_insert_throughput(
+    aio_benchmark: AsyncBenchmark,
+    insert_engine: AsyncEngine,
+    index: str,
+    concurrency: int,
+):
+    table = TABLES[index]
+    user_id = uuid.uuid4()
+
+    async def inserter(rows: int):
+        for _ in range(rows):
+            async with insert_engine.begin() as conn:
+                await conn.execute(
+                    sa.insert(table).values(
+                        id=uuid.uuid4(),
+                        title="benchmark",
+                        content="benchmark",
+                        user_id=user_id,
+                    )
+                )
+
+    async def insert_rows():
+        per_worker = ROWS_PER_ROUND // concurrency
+        await asyncio.gather(*(inserter(per_worker) for _ in range(concurrency)))
+
+    aio_benchmark.pedantic(insert_rows, rounds=5)
+    stats = aio_benchmark.benchmark.stats.stats
+    aio_benchmark.benchmark.extra_info["rows_per_second"] = round(
+        ROWS_PER_ROUND / stats.mean, 1
+    )
@@ -0,0 +1,94 @@
+"Full request path benchmarks: ASGI, auth, session, handler, and serialization"
+
+import httpx
+from app.db import db_session
+from app.models import TodoDAO
+from tests.benchmarks.conftest import AsyncBenchmark
+from tests.conftest import SeedData
+
+
+async def make_todo(seed_data: SeedData) -> TodoDAO:
+    async with db_session() as session:
+        todo_data = {
+            "title": "bench",
+            "content": "bench",
+            "user_id": seed_data.user.id,
+            "space_id": seed_data.space.id,
+        }
+        return await TodoDAO.create(session, todo_data)
+
+
+class TestTodoRouteBenchmarks:
+    def test_create_todo(
+        self,
+        aio_benchmark: AsyncBenchmark,
+        authed_client: httpx.AsyncClient,
+        seed_data: SeedData,
+    ):
+        created = []
+        todo_data = {
+            "title": "bench",
+            "content": "bench",
+            "space_id": str(seed_data.space.id),
+        }
+
+        async def create():
+            resp = await authed_client.post("/todo/", json=todo_data)
+            created.append(resp.json()["id"])
+            return resp
+
+        assert aio_benchmark(create).status_code == 200
+
+        async def cleanup():
+            async with db_session() as session:
+                await TodoDAO.bulk_delete(session, created)
+
+        aio_benchmark.loop.run_until_complete(cleanup())
+
+    def test_list_todos(
+        self,
+        aio_benchmark: AsyncBenchmark,
+        authed_client: httpx.AsyncClient,
+        tmp_todo: TodoDAO,
+    ):
+        resp = aio_benchmark(authed_client.get, "/todo/")
+        assert resp.status_code == 200
+
+    def test_get_todo(
+        self,
+        aio_benchmark: AsyncBenchmark,
+        authed_client: httpx.AsyncClient,
+        tmp_todo: TodoDAO,
+    ):
+        resp = aio_benchmark(authed_client.get, f"/todo/{tmp_todo.id}")
+        assert resp.status_code == 200
+
+    def test_update_todo(
+        self,
+        aio_benchmark: AsyncBenchmark,
+        authed_client: httpx.AsyncClient,
+        tmp_todo: TodoDAO,
+    ):
+        resp = aio_benchmark(
+            authed_client.put, f"/todo/{tmp_todo.id}", json={"content": "updated"}
+        )
+        assert resp.status_code == 200
+
+    def test_delete_todo(
+        self,
+        aio_benchmark: AsyncBenchmark,
+        authed_client: httpx.AsyncClient,
+        seed_data: SeedData,
+    ):
+        "Each round deletes a todo created in (untimed) setup"
+
+        async def setup():
+            todo = await make_todo(seed_data)
+            return (f"/todo/{todo.id}",), {}
+
+        resp = aio_benchmark.pedantic(authed_client.delete, setup=setup)
+        assert resp.status_code == 200
+
+    def test_me(self, aio_benchmark: AsyncBenchmark, authed_client: httpx.AsyncClient):
+        resp = aio_benchmark(authed_client.get, "/me")
+        assert resp.status_code == 200
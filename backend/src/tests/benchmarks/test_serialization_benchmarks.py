@@ -0,0 +1,46 @@
+"""
+GET /todo serialization, pydantic (TodoOut.from_orm + jsonable_encoder +
+JSONResponse) against app.serializers (Core rows + RowEncoder +
+FastJSONResponse).  No database involved, rows are built in memory.
+"""
+
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+from app.models import TodoDAO
+from app.schemas import TodoOut
+from app.serializers import FastJSONResponse, RowEncoder
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+ROWS = 5_000
+
+
+@pytest.fixture(scope="module")
+def rows():
+    now = datetime.now(timezone.utc)
+    space_id = uuid.uuid4()
+    return [
+        (uuid.uuid4(), now, f"todo {i}", "content " * 10, space_id) for i in range(ROWS)
+    ]
+
+
+class TestSerializationBenchmarks:
+    def test_pydantic(self, benchmark, rows):
+        todos = [TodoDAO(**dict(zip(TodoOut.__fields__, row))) for row in rows]
+
+        def serialize():
+            content = jsonable_encoder([TodoOut.from_orm(todo) for todo in todos])
+            return JSONResponse(content).body
+
+        expected = FastJSONResponse([RowEncoder(TodoOut).to_dict(r) for r in rows])
+        assert benchmark(serialize) == expected.body
+
+    def test_fast(self, benchmark, rows):
+        encoder = RowEncoder(TodoOut)
+
+        def serialize():
+            return FastJSONResponse([encoder.to_dict(row) for row in rows]).body
+
+        assert len(benchmark(serialize)) > ROWS
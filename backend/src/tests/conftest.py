@@ -15,7 +15,8 @@ Test authors don't need to do anything with these explicitly -
  6. CockroachDB running in-memory
 
 Final touches -
- 7. Override `minor-illusion` settings to point to external services (autouse=True)
+ 7. Override `minor-illusion` settings to point to external services (autouse=True),
+    and change settings for a single test
  8. Create the `minor-illusion` FastAPI app
  9. Bump pytest-asyncio event_loop fixture to session scope
 """
@@ -31,7 +32,17 @@ import tempfile
 import time
 from contextlib import contextmanager
 from types import TracebackType
-from typing import Callable, ContextManager, List, Optional, Tuple, Type
+from typing import (
+    Any,
+    Callable,
+    ContextManager,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Type,
+)
 
 import faker
 import httpx
@@ -452,7 +463,7 @@ def cockroach(
 
 # 7. Override `minor-illusion` settings -------------------------------------
 @pytest.fixture(scope="session", autouse=True)
-def override_settings(cockroach: CockroachDetails) -> Settings:
+def test_settings(cockroach: CockroachDetails) -> Settings:
     """
     Override `minor-illusion` settings with connection details
     for our managed external/test services instead of prod services.
@@ -464,6 +475,37 @@ def override_settings(cockroach: CockroachDetails) -> Settings:
     return settings
 
 
+class SettingsOverride:
+    """
+    Call with Settings fields as keyword arguments to change them until the
+    end of the test, or until restore() if something (an engine, a cached
+    backend) has to be rebuilt from the original values.
+    """
+
+    def __init__(self, settings: Settings) -> None:
+        self.settings = settings
+        self._previous: Dict[str, Any] = {}
+
+    def __call__(self, **values: Any) -> Settings:
+        for name, value in values.items():
+            self._previous.setdefault(name, getattr(self.settings, name))
+            setattr(self.settings, name, value)
+        return self.settings
+
+    def restore(self) -> None:
+        for name, value in self._previous.items():
+            setattr(self.settings, name, value)
+        self._previous.clear()
+
+
+@pytest.fixture
+def override_settings(test_settings: Settings) -> Iterator[SettingsOverride]:
+    "Change settings for one test, e.g. override_settings(FAST_SERIALIZER=True)"
+    override = SettingsOverride(test_settings)
+    yield override
+    override.restore()
+
+
 # 8. Create the `minor-illusion` app ----------------------------------------
 @pytest.fixture
 async def app() -> FastAPI:
@@ -1,6 +1,17 @@
+import asyncio
+import time
+import uuid
+
 import httpx
 import pytest
+from app.auth import SECRET_KEY, create_token, delete_user
+from app.cache import get_token_cache, get_user_cache
+from app.db import db_session
 from app.models import UserDAO
+from app.revocation import RevocationList, get_revocation_list
+from app.tokens import ALGORITHM, get_jwt_backend
+from jose import jwt
+from tests.conftest import SettingsOverride
 
 
 @pytest.mark.asyncio
@@ -32,9 +43,254 @@ class TestAuth:
         assert resp.status_code == 403
         assert resp.json() == {"detail": "Incorrect password"}
 
+    async def test_null_password(self, client: httpx.AsyncClient, tmp_user: UserDAO):
+        async with db_session() as session:
+            await UserDAO.bulk_update(session, [{"id": tmp_user.id, "password": None}])
+        data = {"username": tmp_user.name, "password": ""}
+        resp = await client.post("/auth/login", data=data)
+        assert resp.status_code == 403
+        assert resp.json() == {"detail": "Incorrect password"}
+
+    async def test_login_rehashes_plaintext(
+        self, client: httpx.AsyncClient, tmp_user: UserDAO
+    ):
+        "tmp_user is created with a plaintext password, logging in hashes it"
+        data = {"username": tmp_user.name, "password": tmp_user.password}
+        resp = await client.post("/auth/login", data=data)
+        assert resp.status_code == 200
+        async with db_session() as session:
+            db_user = await UserDAO.get(session, tmp_user.id)
+        assert db_user.password.startswith("scrypt$")
+        assert tmp_user.password not in db_user.password
+
+        # The hash verifies on the next login
+        resp = await client.post("/auth/login", data=data)
+        assert resp.status_code == 200
+        data["password"] += "invalid"
+        resp = await client.post("/auth/login", data=data)
+        assert resp.status_code == 403
+
     async def test_user_does_not_exist(self, client: httpx.AsyncClient):
         endpoint = "/auth/login"
         data = {"username": "missing", "password": "missing"}
         resp = await client.post(endpoint, data=data)
         assert resp.status_code == 401
         assert resp.json() == {"detail": "User not found"}
+
+
+@pytest.fixture
+def stateless_auth(override_settings: SettingsOverride):
+    "Build RequestContext from JWT claims instead of the database"
+    override_settings(AUTH_STATELESS=True)
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("stateless_auth")
+class TestStatelessAuth:
+    async def test_me_uses_user_cache(
+        self, client: httpx.AsyncClient, tmp_user: UserDAO
+    ):
+        data = {"username": tmp_user.name, "password": tmp_user.password}
+        resp = await client.post("/auth/login", data=data)
+        assert resp.status_code == 200
+        auth_header = {"Authorization": f"bearer {resp.json()['access_token']}"}
+
+        cache = get_user_cache()
+        hits = cache.hits
+        for _ in range(2):
+            resp = await client.get("/me", headers=auth_header)
+            assert resp.status_code == 200
+            assert resp.json()["name"] == tmp_user.name
+        # first request fills the cache, second is served from it
+        assert cache.hits == hits + 1
+
+    async def test_delete_invalidates_user_cache(self, tmp_user: UserDAO):
+        cache = get_user_cache()
+        cache.set(tmp_user.id, tmp_user)
+        async with db_session() as session:
+            await UserDAO.delete(session, tmp_user.id)
+        assert cache.get(tmp_user.id) is None
+
+
+@pytest.fixture(params=["jose", "hmac"])
+def jwt_backend(request, override_settings: SettingsOverride):
+    "Run a test with each JWT backend"
+    override_settings(JWT_BACKEND=request.param)
+    get_jwt_backend.cache_clear()
+    yield request.param
+    override_settings.restore()
+    get_jwt_backend.cache_clear()
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("jwt_backend")
+class TestTokens:
+    async def test_cached_token(self, client: httpx.AsyncClient, tmp_user: UserDAO):
+        token = create_token(tmp_user.id)
+        auth_header = {"Authorization": f"bearer {token}"}
+        cache = get_token_cache()
+        hits = cache.hits
+        for _ in range(2):
+            resp = await client.get("/me", headers=auth_header)
+            assert resp.status_code == 200
+        assert cache.hits == hits + 1
+
+    async def test_expired_token(self, client: httpx.AsyncClient, tmp_user: UserDAO):
+        claims = {"user_id": str(tmp_user.id), "exp": int(time.time()) + 1}
+        token = jwt.encode(claims, SECRET_KEY, algorithm=ALGORITHM)
+        auth_header = {"Authorization": f"bearer {token}"}
+        resp = await client.get("/me", headers=auth_header)
+        assert resp.status_code == 200
+        # Still cached, but past exp
+        await asyncio.sleep(1.1)
+        resp = await client.get("/me", headers=auth_header)
+        assert resp.status_code == 401
+
+    async def test_tampered_token(self, client: httpx.AsyncClient, tmp_user: UserDAO):
+        header, payload, signature = create_token(tmp_user.id).split(".")
+        forged = jwt.encode({"user_id": str(uuid.uuid4())}, "not the secret")
+        token = ".".join([header, forged.split(".")[1], signature])
+        resp = await client.get("/me", headers={"Authorization": f"bearer {token}"})
+        assert resp.status_code == 401
+
+    async def test_token_without_exp(
+        self, client: httpx.AsyncClient, tmp_user: UserDAO
+    ):
+        token = jwt.encode({"user_id": str(tmp_user.id)}, SECRET_KEY, ALGORITHM)
+        resp = await client.get("/me", headers={"Authorization": f"bearer {token}"})
+        assert resp.status_code == 401
+
+
+async def login(client: httpx.AsyncClient, user: UserDAO) -> dict:
+    data = {"username": user.name, "password": user.password}
+    resp = await client.post("/auth/login", data=data)
+    assert resp.status_code == 200
+    return resp.json()
+
+
+@pytest.mark.asyncio
+class TestRefreshAndRevocation:
+    async def test_login_returns_expiring_tokens(
+        self, client: httpx.AsyncClient, tmp_user: UserDAO
+    ):
+        body = await login(client, tmp_user)
+        assert body["expires_in"] > 0
+        claims = jwt.get_unverified_claims(body["access_token"])
+        assert claims["type"] == "access"
+        assert claims["exp"] == claims["iat"] + body["expires_in"]
+        assert jwt.get_unverified_claims(body["refresh_token"])["type"] == "refresh"
+
+    async def test_refresh(self, client: httpx.AsyncClient, tmp_user: UserDAO):
+        body = await login(client, tmp_user)
+        resp = await client.post(
+            "/auth/refresh", json={"refresh_token": body["refresh_token"]}
+        )
+        assert resp.status_code == 200
+        refreshed = resp.json()
+        assert refreshed["refresh_token"] != body["refresh_token"]
+        auth_header = {"Authorization": f"bearer {refreshed['access_token']}"}
+        resp = await client.get("/me", headers=auth_header)
+        assert resp.status_code == 200
+
+        # Refresh tokens are single use
+        resp = await client.post(
+            "/auth/refresh", json={"refresh_token": body["refresh_token"]}
+        )
+        assert resp.status_code == 401
+
+    async def test_token_types_are_not_interchangeable(
+        self, client: httpx.AsyncClient, tmp_user: UserDAO
+    ):
+        body = await login(client, tmp_user)
+        auth_header = {"Authorization": f"bearer {body['refresh_token']}"}
+        resp = await client.get("/me", headers=auth_header)
+        assert resp.status_code == 401
+        resp = await client.post(
+            "/auth/refresh", json={"refresh_token": body["access_token"]}
+        )
+        assert resp.status_code == 401
+
+    async def test_logout(self, client: httpx.AsyncClient, tmp_user: UserDAO):
+        body = await login(client, tmp_user)
+        auth_header = {"Authorization": f"bearer {body['access_token']}"}
+        resp = await client.post(
+            "/auth/logout",
+            json={"refresh_token": body["refresh_token"]},
+            headers=auth_header,
+        )
+        assert resp.status_code == 200
+        resp = await client.get("/me", headers=auth_header)
+        assert resp.status_code == 401
+        resp = await client.post(
+            "/auth/refresh", json={"refresh_token": body["refresh_token"]}
+        )
+        assert resp.status_code == 401
+
+    async def test_delete_me_revokes_tokens(
+        self, client: httpx.AsyncClient, tmp_user: UserDAO
+    ):
+        body = await login(client, tmp_user)
+        auth_header = {"Authorization": f"bearer {body['access_token']}"}
+        resp = await client.delete("/me", headers=auth_header)
+        assert resp.status_code == 200
+        resp = await client.get("/me", headers=auth_header)
+        assert resp.status_code == 401
+        resp = await client.post(
+            "/auth/refresh", json={"refresh_token": body["refresh_token"]}
+        )
+        assert resp.status_code == 401
+
+    async def test_delete_user_revokes_tokens(
+        self, client: httpx.AsyncClient, tmp_user: UserDAO
+    ):
+        body = await login(client, tmp_user)
+        async with db_session() as session:
+            assert await delete_user(session, tmp_user.id)
+        # As another process would see it, from the revoked_tokens table
+        revocations = get_revocation_list()
+        revocations.users.pop(str(tmp_user.id), None)
+        await revocations.refresh()
+        assert revocations.is_revoked(jwt.get_unverified_claims(body["access_token"]))
+        auth_header = {"Authorization": f"bearer {body['access_token']}"}
+        resp = await client.get("/me", headers=auth_header)
+        assert resp.status_code == 401
+
+    async def test_delete_missing_user_revokes_nothing(self):
+        user_id = uuid.uuid4()
+        async with db_session() as session:
+            assert not await delete_user(session, user_id)
+        assert str(user_id) not in get_revocation_list().users
+
+    async def test_revoke_applies_on_commit(self, tmp_user: UserDAO):
+        claims = jwt.get_unverified_claims(create_token(tmp_user.id))
+        revocations = get_revocation_list()
+        async with db_session() as session:
+            revocations.revoke(session, claims)
+            await session.flush()
+            assert not revocations.is_revoked(claims)
+            await session.rollback()
+        assert not revocations.is_revoked(claims)
+
+        async with db_session() as session:
+            revocations.revoke(session, claims)
+        assert revocations.is_revoked(claims)
+
+    async def test_user_revocation_covers_same_second(self):
+        revocations = RevocationList()
+        user_id = str(uuid.uuid4())
+        revocations.users[user_id] = 1000.5
+        assert revocations.is_revoked({"user_id": user_id, "iat": 999})
+        # Could have been issued just before the revocation
+        assert revocations.is_revoked({"user_id": user_id, "iat": 1000})
+        assert not revocations.is_revoked({"user_id": user_id, "iat": 1001})
+        assert not revocations.is_revoked({"user_id": user_id})
+
+    async def test_start_survives_failed_load(self):
+        class Unreachable(RevocationList):
+            async def refresh(self) -> int:
+                raise ConnectionError("database is down")
+
+        revocations = Unreachable(poll_interval=60)
+        await revocations.start()
+        assert revocations._task is not None
+        await revocations.stop()
@@ -1,10 +1,14 @@
+import json
 import re
 import uuid
 
 import httpx
 import pytest
+import sqlalchemy as sa
+from app.db import db_session, get_engine
 from app.models import TodoDAO
-from app.schemas import TodoCreate, TodoUpdate
+from app.schemas import BULK_MAX_ITEMS, TodoCreate, TodoOut, TodoUpdate
+from tests.conftest import SettingsOverride
 
 
 @pytest.mark.asyncio
@@ -16,6 +20,27 @@ class TestReadTodos:
         resp = await client.get(endpoint)
         assert resp.json()["id"] == str(tmp_todo.id)
 
+    @pytest.mark.usefixtures("auth_seed_user")
+    async def test_read_single_query(
+        self, client: httpx.AsyncClient, tmp_todo: TodoDAO
+    ):
+        "Relationships aren't loaded by default, reading a todo is one SELECT"
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        engine = get_engine().sync_engine
+        sa.event.listen(engine, "before_cursor_execute", record)
+        try:
+            resp = await client.get(f"/todo/{tmp_todo.id}")
+        finally:
+            sa.event.remove(engine, "before_cursor_execute", record)
+        assert resp.status_code == 200
+        assert (
+            len([s for s in statements if s.lstrip().upper().startswith("SELECT")]) == 1
+        )
+
     @pytest.mark.xfail(reason="No RBAC implemented in minor-illusion yet")
     @pytest.mark.usefixtures("auth_tmp_user")
     async def test_read_unauth_user(self, client: httpx.AsyncClient, tmp_todo: TodoDAO):
@@ -40,6 +65,35 @@ class TestReadTodos:
         assert len(todo_ids) >= 1
         assert str(tmp_todo.id) in todo_ids
 
+    @pytest.mark.usefixtures("auth_seed_user")
+    async def test_read_todos_paginated(
+        self, client: httpx.AsyncClient, tmp_todo: TodoDAO
+    ):
+        "Follow the next cursor one todo at a time, pages shouldn't overlap"
+        seen = []
+        params = {"limit": 1}
+        while str(tmp_todo.id) not in seen:
+            resp = await client.get("/todo", params=params)
+            assert resp.status_code == 200
+            page = [t["id"] for t in resp.json()]
+            assert len(page) == 1
+            assert page[0] not in seen
+            seen.extend(page)
+            params["cursor"] = resp.headers["X-Next-Cursor"]
+
+    @pytest.mark.usefixtures("auth_seed_user")
+    async def test_read_todos_invalid_cursor(self, client: httpx.AsyncClient):
+        resp = await client.get("/todo", params={"cursor": "not-a-cursor"})
+        assert resp.status_code == 400
+
+    @pytest.mark.usefixtures("auth_seed_user")
+    async def test_stream_todos(self, client: httpx.AsyncClient, tmp_todo: TodoDAO):
+        resp = await client.get("/todo", params={"stream": True})
+        assert resp.status_code == 200
+        assert resp.headers["content-type"] == "application/x-ndjson"
+        todos = [json.loads(line) for line in resp.text.splitlines()]
+        assert str(tmp_todo.id) in [t["id"] for t in todos]
+
 
 @pytest.mark.asyncio
 class TestCreateTodos:
@@ -163,3 +217,195 @@ class TestDeleteTodos:
         endpoint = f"/todo/{uuid.uuid4()}"
         resp = await client.delete(endpoint)
         assert resp.status_code == 404
+
+
+@pytest.mark.asyncio
+class TestBulkTodos:
+    @pytest.mark.usefixtures("auth_seed_user")
+    async def test_bulk_create_update_delete(
+        self, client: httpx.AsyncClient, seed_data
+    ):
+        # Create
+        body = [
+            {
+                "title": f"bulk {i}",
+                "content": "bulk content",
+                "space_id": str(seed_data.space.id),
+            }
+            for i in range(3)
+        ]
+        resp = await client.post("/todo/bulk", json=body)
+        assert resp.status_code == 200
+        created = resp.json()
+        assert [t["title"] for t in created] == ["bulk 0", "bulk 1", "bulk 2"]
+        ids = [t["id"] for t in created]
+
+        # Update two existing todos (setting different fields) and one missing id
+        missing_id = str(uuid.uuid4())
+        body = [
+            {"id": ids[0], "title": "new title"},
+            {"id": ids[1], "content": "new content"},
+            {"id": missing_id, "title": "never written"},
+        ]
+        resp = await client.patch("/todo/bulk", json=body)
+        assert resp.status_code == 200
+        results = resp.json()
+        assert [r["status"] for r in results] == [200, 200, 404]
+        assert results[0]["todo"]["title"] == "new title"
+        assert results[0]["todo"]["content"] == "bulk content"
+        assert results[1]["todo"]["title"] == "bulk 1"
+        assert results[1]["todo"]["content"] == "new content"
+
+        resp = await client.get(f"/todo/{ids[0]}")
+        assert resp.json()["title"] == "new title"
+
+        # Delete all three plus a missing id
+        resp = await client.request("DELETE", "/todo/bulk", json=ids + [missing_id])
+        assert resp.status_code == 200
+        assert [r["status"] for r in resp.json()] == [200, 200, 200, 404]
+        for id in ids:
+            resp = await client.get(f"/todo/{id}")
+            assert resp.status_code == 404
+
+    @pytest.mark.usefixtures("auth_tmp_user")
+    async def test_bulk_other_users_todos(
+        self, client: httpx.AsyncClient, tmp_todo: TodoDAO
+    ):
+        "tmp_todo is owned by the seed user, tmp_user's bulk writes don't touch it"
+        body = [{"id": str(tmp_todo.id), "title": "not yours"}]
+        resp = await client.patch("/todo/bulk", json=body)
+        assert resp.status_code == 200
+        assert [r["status"] for r in resp.json()] == [404]
+
+        resp = await client.request("DELETE", "/todo/bulk", json=[str(tmp_todo.id)])
+        assert resp.status_code == 200
+        assert [r["status"] for r in resp.json()] == [404]
+
+        async with db_session() as session:
+            todo = await TodoDAO.get(session, tmp_todo.id)
+        assert todo is not None
+        assert todo.title == tmp_todo.title
+
+    @pytest.mark.usefixtures("auth_seed_user")
+    async def test_bulk_create_too_many(self, client: httpx.AsyncClient, seed_data):
+        item = {"title": "t", "content": "c", "space_id": str(seed_data.space.id)}
+        resp = await client.post("/todo/bulk", json=[item] * (BULK_MAX_ITEMS + 1))
+        assert resp.status_code == 422
+
+
+@pytest.mark.asyncio
+class TestTodoETags:
+    @pytest.mark.usefixtures("auth_seed_user")
+    async def test_read_not_modified(
+        self, client: httpx.AsyncClient, tmp_todo: TodoDAO
+    ):
+        endpoint = f"/todo/{tmp_todo.id}"
+        resp = await client.get(endpoint)
+        etag = resp.headers["ETag"]
+        resp = await client.get(endpoint, headers={"If-None-Match": etag})
+        assert resp.status_code == 304
+        assert resp.content == b""
+
+        # Updating the todo changes its ETag
+        resp = await client.put(endpoint, json={"content": "changed"})
+        resp = await client.get(endpoint, headers={"If-None-Match": etag})
+        assert resp.status_code == 200
+        assert resp.headers["ETag"] != etag
+
+    @pytest.mark.usefixtures("auth_seed_user")
+    async def test_list_not_modified(
+        self, client: httpx.AsyncClient, tmp_todo: TodoDAO
+    ):
+        item = {"title": "t", "content": "c", "space_id": str(tmp_todo.space_id)}
+        resp = await client.post("/todo", json=item)
+        second_id = resp.json()["id"]
+        resp = await client.get("/todo")
+        etag = resp.headers["ETag"]
+        resp = await client.get("/todo", headers={"If-None-Match": etag})
+        assert resp.status_code == 304
+
+        # A different page of the same list has a different ETag
+        resp = await client.get("/todo", params={"limit": 1})
+        assert resp.headers["ETag"] != etag
+        await client.delete(f"/todo/{second_id}")
+
+    @pytest.mark.usefixtures("auth_seed_user")
+    async def test_list_etag_changes_on_write(
+        self, client: httpx.AsyncClient, tmp_todo: TodoDAO
+    ):
+        resp = await client.get("/todo")
+        etag = resp.headers["ETag"]
+        resp = await client.put(f"/todo/{tmp_todo.id}", json={"title": "changed"})
+        assert resp.status_code == 200
+
+        resp = await client.get("/todo", headers={"If-None-Match": etag})
+        assert resp.status_code == 200
+        assert resp.headers["ETag"] != etag
+        titles = {t["id"]: t["title"] for t in resp.json()}
+        assert titles[str(tmp_todo.id)] == "changed"
+
+    @pytest.mark.usefixtures("auth_seed_user")
+    async def test_list_etag_changes_on_delete(
+        self, client: httpx.AsyncClient, tmp_todo: TodoDAO
+    ):
+        resp = await client.get("/todo")
+        etag = resp.headers["ETag"]
+        resp = await client.delete(f"/todo/{tmp_todo.id}")
+        assert resp.status_code == 200
+
+        resp = await client.get("/todo", headers={"If-None-Match": etag})
+        assert resp.status_code == 200
+        assert resp.headers["ETag"] != etag
+        assert str(tmp_todo.id) not in {t["id"] for t in resp.json()}
+
+
+@pytest.fixture
+def fast_serializer(override_settings: SettingsOverride):
+    override_settings(FAST_SERIALIZER=True)
+
+
+@pytest.mark.asyncio
+class TestFastSerializer:
+    @pytest.mark.usefixtures("auth_seed_user")
+    async def test_same_response(
+        self,
+        client: httpx.AsyncClient,
+        tmp_todo: TodoDAO,
+        override_settings: SettingsOverride,
+    ):
+        "Fast and pydantic serialization produce the same page, byte for byte"
+        params = {"limit": 2}
+        slow = await client.get("/todo", params=params)
+        override_settings(FAST_SERIALIZER=True)
+        fast = await client.get("/todo", params=params)
+        assert fast.status_code == slow.status_code == 200
+        assert fast.content == slow.content
+        assert fast.headers["ETag"] == slow.headers["ETag"]
+        assert fast.headers.get("X-Next-Cursor") == slow.headers.get("X-Next-Cursor")
+
+    @pytest.mark.usefixtures("auth_seed_user", "fast_serializer")
+    async def test_paginated(self, client: httpx.AsyncClient, tmp_todo: TodoDAO):
+        seen = []
+        params = {"limit": 1}
+        while str(tmp_todo.id) not in seen:
+            resp = await client.get("/todo", params=params)
+            assert resp.status_code == 200
+            page = [t["id"] for t in resp.json()]
+            assert len(page) == 1
+            assert page[0] not in seen
+            seen.extend(page)
+            params["cursor"] = resp.headers["X-Next-Cursor"]
+
+    @pytest.mark.usefixtures("auth_seed_user", "fast_serializer")
+    async def test_stream(self, client: httpx.AsyncClient, tmp_todo: TodoDAO):
+        resp = await client.get("/todo", params={"stream": True})
+        assert resp.status_code == 200
+        todos = [json.loads(line) for line in resp.text.splitlines()]
+        assert TodoOut(**todos[0])
+        assert str(tmp_todo.id) in [t["id"] for t in todos]
+
+    async def test_openapi_unchanged(self, app):
+        schema = app.openapi()["paths"]["/todo/"]["get"]["responses"]["200"]
+        assert schema["content"]["application/json"]["schema"]["items"] == {
+            "$ref": "#/components/schemas/TodoOut"
+        }
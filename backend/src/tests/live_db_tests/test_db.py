@@ -0,0 +1,404 @@
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+import httpx
+import pytest
+import sqlalchemy as sa
+from app.auth import create_token
+from app.db import (
+    SERIALIZATION_FAILURE,
+    FollowerReadSession,
+    SessionRoute,
+    db_session,
+    dispose_engine,
+    get_engine,
+    get_session,
+    retry_counts,
+    run_transaction,
+)
+from app.models import BaseDAO, TodoDAO
+from app.schemas import TodoOut
+from fastapi import APIRouter, Depends, FastAPI
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from tests.conftest import SettingsOverride
+
+
+class FakeDriverError(Exception):
+    "Stand-in for the driver exception that SQLAlchemy wraps in DBAPIError"
+
+    def __init__(self, pgcode: str):
+        super().__init__(pgcode)
+        self.pgcode = pgcode
+
+
+@pytest.mark.asyncio
+class TestEngine:
+    @pytest.mark.usefixtures("auth_seed_user")
+    async def test_shared_across_requests(
+        self, client: httpx.AsyncClient, tmp_todo: TodoDAO
+    ):
+        "Requests run on the process-wide engine, not on engines of their own"
+        engine = get_engine()
+        engines = set()
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            engines.add(conn.engine)
+
+        sa.event.listen(sa.engine.Engine, "before_cursor_execute", record)
+        try:
+            for _ in range(2):
+                resp = await client.get(f"/todo/{tmp_todo.id}")
+                assert resp.status_code == 200
+        finally:
+            sa.event.remove(sa.engine.Engine, "before_cursor_execute", record)
+        assert engines == {engine.sync_engine}
+        assert get_engine() is engine
+        assert engine.sync_engine.pool.checkedout() == 0
+
+    async def test_disposed_on_shutdown(self, app: FastAPI):
+        engine = get_engine()
+        pool = engine.sync_engine.pool
+        async with db_session() as session:
+            await session.execute(sa.select(1))
+        assert pool.checkedin() > 0
+
+        await app.router.shutdown()
+        assert pool.checkedin() == 0
+        # The next use creates a new engine
+        assert get_engine() is not engine
+
+
+@pytest.fixture
+async def token_client(app: FastAPI, seed_data) -> httpx.AsyncClient:
+    "Client with a real JWT without name claims, so get_rctx queries the user"
+    token = create_token(seed_data.user.id)
+    async with httpx.AsyncClient(
+        app=app,
+        base_url="http://test",
+        follow_redirects=True,
+        headers={"Authorization": f"bearer {token}"},
+    ) as client:
+        yield client
+
+
+@contextmanager
+def session_events() -> Iterator[Dict[str, List[Session]]]:
+    "Record which sessions begin and commit transactions"
+    events = {"after_begin": [], "after_commit": []}
+    listeners = {
+        "after_begin": lambda session, *args: events["after_begin"].append(session),
+        "after_commit": lambda session: events["after_commit"].append(session),
+    }
+    for name, listener in listeners.items():
+        sa.event.listen(Session, name, listener)
+    try:
+        yield events
+    finally:
+        for name, listener in listeners.items():
+            sa.event.remove(Session, name, listener)
+
+
+@pytest.mark.asyncio
+class TestRequestSession:
+    async def test_one_session_per_request(
+        self, token_client: httpx.AsyncClient, seed_data
+    ):
+        "get_rctx and the handler share one session, committed before responding"
+        data = {"title": "t", "content": "c", "space_id": str(seed_data.space.id)}
+        with session_events() as events:
+            resp = await token_client.post("/todo/", json=data)
+        assert resp.status_code == 200
+        assert len(set(events["after_begin"])) == 1
+        assert events["after_commit"] == events["after_begin"][:1]
+
+        # Committed by the time the client has the response
+        id = uuid.UUID(resp.json()["id"])
+        async with db_session() as session:
+            assert await TodoDAO.get(session, id) is not None
+            await TodoDAO.delete(session, id)
+
+    async def test_get_is_not_committed(
+        self, token_client: httpx.AsyncClient, tmp_todo: TodoDAO
+    ):
+        with session_events() as events:
+            resp = await token_client.get(f"/todo/{tmp_todo.id}")
+        assert resp.status_code == 200
+        assert len(set(events["after_begin"])) == 1
+        assert events["after_commit"] == []
+
+
+@pytest.mark.asyncio
+class TestCreate:
+    async def test_single_insert(self, seed_data):
+        "Server defaults come back from INSERT ... RETURNING, with no SELECT"
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement.split()[0].upper())
+
+        data = {
+            "title": "created",
+            "content": "created",
+            "user_id": seed_data.user.id,
+            "space_id": seed_data.space.id,
+        }
+        engine = get_engine().sync_engine
+        sa.event.listen(engine, "before_cursor_execute", record)
+        try:
+            async with db_session() as session:
+                todo = await TodoDAO.create(session, data)
+                assert sa.inspect(todo).persistent
+        finally:
+            sa.event.remove(engine, "before_cursor_execute", record)
+        assert statements == ["INSERT"]
+
+        # Still readable once committed and the session is closed
+        assert isinstance(todo.id, uuid.UUID)
+        assert todo.title == "created"
+        async with db_session() as session:
+            loaded = await TodoDAO.get(session, todo.id)
+            assert loaded.created_at == todo.created_at
+            assert loaded.updated_at == todo.updated_at
+            await TodoDAO.delete(session, todo.id)
+
+
+@pytest.mark.asyncio
+class TestLoadOptions:
+    async def test_not_loaded_by_default(self, tmp_todo: TodoDAO):
+        async with db_session() as session:
+            todo = await TodoDAO.get(session, tmp_todo.id)
+        with pytest.raises(sa.exc.InvalidRequestError):
+            todo.user
+
+    async def test_loaded_when_asked(self, tmp_todo: TodoDAO, seed_data):
+        options = [sa.orm.joinedload(TodoDAO.user)]
+        async with db_session() as session:
+            todo = await TodoDAO.get(session, tmp_todo.id, options=options)
+        assert todo.user.id == seed_data.user.id
+
+    async def test_mapper_default_unchanged(self, tmp_todo: TodoDAO, seed_data):
+        "Queries outside the DAO methods still eager load relationships"
+        async with db_session() as session:
+            statement = sa.select(TodoDAO).where(TodoDAO.id == tmp_todo.id)
+            todo = (await session.execute(statement)).scalar_one()
+        assert todo.user.id == seed_data.user.id
+        assert todo.space.id == seed_data.space.id
+
+
+@pytest.fixture
+async def follower_reads(override_settings: SettingsOverride):
+    "Recreate the engines with DB_FOLLOWER_READS on"
+    override_settings(DB_FOLLOWER_READS=True)
+    await dispose_engine()
+    yield
+    override_settings.restore()
+    await dispose_engine()
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("follower_reads", "auth_seed_user")
+class TestFollowerReads:
+    async def test_reads_use_follower_reads(self, client: httpx.AsyncClient):
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        engine = get_engine().sync_engine
+        sa.event.listen(engine, "before_cursor_execute", record)
+        try:
+            with session_events() as events:
+                resp = await client.get("/todo/")
+        finally:
+            sa.event.remove(engine, "before_cursor_execute", record)
+        assert resp.status_code == 200
+        assert [type(session) for session in events["after_begin"]] == [
+            FollowerReadSession
+        ]
+        assert "AS OF SYSTEM TIME follower_read_timestamp()" in statements[0]
+
+    async def test_writes_use_primary(self, client: httpx.AsyncClient, seed_data):
+        data = {"title": "t", "content": "c", "space_id": str(seed_data.space.id)}
+        with session_events() as events:
+            resp = await client.post("/todo/", json=data)
+        assert resp.status_code == 200
+        assert events["after_begin"]
+        for session in events["after_begin"]:
+            assert not isinstance(session, FollowerReadSession)
+
+        async with db_session() as session:
+            await TodoDAO.delete(session, uuid.UUID(resp.json()["id"]))
+
+
+@pytest.mark.asyncio
+class TestRunTransaction:
+    async def test_retries_serialization_failure(self, tmp_todo: TodoDAO):
+        attempts = []
+
+        async def callback(session):
+            attempts.append(1)
+            todo = await TodoDAO.get(session, tmp_todo.id)
+            if len(attempts) == 1:
+                orig = FakeDriverError(SERIALIZATION_FAILURE)
+                raise sa.exc.DBAPIError("SELECT", {}, orig)
+            return todo
+
+        retries = retry_counts["run_transaction"]
+        todo = await run_transaction(callback)
+        assert todo.id == tmp_todo.id
+        assert len(attempts) == 2
+        assert retry_counts["run_transaction"] == retries + 1
+
+    async def test_other_errors_are_not_retried(self):
+        attempts = []
+
+        async def callback(session):
+            attempts.append(1)
+            raise sa.exc.DBAPIError("SELECT", {}, FakeDriverError("23505"))
+
+        with pytest.raises(sa.exc.DBAPIError):
+            await run_transaction(callback)
+        assert len(attempts) == 1
+
+
+@pytest.mark.asyncio
+class TestSessionRouteRetries:
+    async def test_retries_serialization_failure(self, tmp_todo: TodoDAO):
+        "The whole handler is re-run, with a new session, and the client gets a 200"
+        sessions = []
+        router = APIRouter(route_class=SessionRoute)
+
+        @router.post("/flaky")
+        async def flaky(session: AsyncSession = Depends(get_session)):
+            sessions.append(session)
+            todo = await TodoDAO.get(session, tmp_todo.id)
+            if len(sessions) == 1:
+                orig = FakeDriverError(SERIALIZATION_FAILURE)
+                raise sa.exc.DBAPIError("SELECT", {}, orig)
+            return {"id": str(todo.id)}
+
+        app = FastAPI()
+        app.include_router(router)
+        retries = retry_counts["/flaky"]
+        async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+            resp = await client.post("/flaky")
+        assert resp.status_code == 200
+        assert resp.json() == {"id": str(tmp_todo.id)}
+        assert len(sessions) == 2
+        assert sessions[0] is not sessions[1]
+        assert retry_counts["/flaky"] == retries + 1
+
+
+@pytest.mark.asyncio
+class TestCoreReads:
+    async def test_get_row(self, tmp_todo: TodoDAO):
+        async with db_session() as session:
+            row = await TodoDAO.get_row(session, tmp_todo.id, TodoOut, "updated_at")
+            assert len(session.identity_map) == 0
+        assert row._fields == (*TodoOut.__fields__, "updated_at")
+        assert TodoOut.from_orm(row) == TodoOut.from_orm(tmp_todo)
+
+    async def test_get_missing_row(self):
+        async with db_session() as session:
+            assert await TodoDAO.get_row(session, uuid.uuid4(), TodoOut) is None
+
+    async def test_get_todo_rows_page(self, tmp_todo: TodoDAO, seed_data):
+        async with db_session() as session:
+            rows = await TodoDAO.get_todo_rows_page(
+                session, seed_data.user.id, TodoOut, limit=1000
+            )
+            assert len(session.identity_map) == 0
+        assert "user_id" not in rows[0]._fields
+        assert tmp_todo.id in [row.id for row in rows]
+
+    async def test_get_todo_rows_by_username(self, tmp_todo: TodoDAO, seed_data):
+        async with db_session() as session:
+            rows = await TodoDAO.get_todo_rows_by_username(
+                session, seed_data.user.name, TodoOut
+            )
+            assert await TodoDAO.get_todos_by_username(session, "missing") == []
+        assert tmp_todo.id in [row.id for row in rows]
+
+
+@pytest.mark.asyncio
+class TestStatementCache:
+    async def test_statements_are_reused(self, tmp_todo: TodoDAO):
+        async with db_session() as session:
+            assert (await TodoDAO.get(session, tmp_todo.id)).id == tmp_todo.id
+            statement = BaseDAO._statements[(TodoDAO, "get")]
+            assert await TodoDAO.get(session, uuid.uuid4()) is None
+        assert BaseDAO._statements[(TodoDAO, "get")] is statement
+
+    async def test_delete_expunges_loaded_object(self, tmp_todo: TodoDAO):
+        async with db_session() as session:
+            todo = await TodoDAO.get(session, tmp_todo.id)
+            assert await TodoDAO.delete(session, tmp_todo.id) == 1
+            assert todo not in session
+            assert await TodoDAO.get(session, tmp_todo.id) is None
+
+
+async def explain(query) -> str:
+    "EXPLAIN plan of the last SELECT that awaiting query(session) executes"
+    selects = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            selects.append((statement, parameters))
+
+    engine = get_engine()
+    sa.event.listen(engine.sync_engine, "before_cursor_execute", record)
+    try:
+        async with db_session() as session:
+            await query(session)
+    finally:
+        sa.event.remove(engine.sync_engine, "before_cursor_execute", record)
+    statement, parameters = selects[-1]
+    async with engine.connect() as conn:
+        results = await conn.exec_driver_sql("EXPLAIN " + statement, parameters)
+        return "\n".join(str(row[0]) for row in results)
+
+
+@pytest.mark.asyncio
+class TestQueryPlans:
+    "List queries should be served from the covering todo indexes alone"
+
+    async def test_todos_page(self, seed_data):
+        plan = await explain(
+            lambda session: TodoDAO.get_todo_rows_page(
+                session, seed_data.user.id, TodoOut, limit=10
+            )
+        )
+        assert "todo@ix_todo_user_id_created_at_id" in plan
+        assert "index join" not in plan
+        assert "sort" not in plan
+
+    async def test_todos_page_after_cursor(self, tmp_todo: TodoDAO, seed_data):
+        after = (tmp_todo.created_at, tmp_todo.id)
+        plan = await explain(
+            lambda session: TodoDAO.get_todo_rows_page(
+                session, seed_data.user.id, TodoOut, limit=10, after=after
+            )
+        )
+        assert "todo@ix_todo_user_id_created_at_id" in plan
+        assert "index join" not in plan
+
+    async def test_todos_by_username(self, seed_data):
+        plan = await explain(
+            lambda session: TodoDAO.get_todos_by_username(session, seed_data.user.name)
+        )
+        assert "todo@ix_todo_user_id_created_at_id" in plan
+        assert "index join" not in plan
+
+    async def test_todos_by_space(self, seed_data):
+        columns = TodoDAO.columns_for(TodoOut)
+        statement = (
+            sa.select(*columns)
+            .where(TodoDAO.space_id == seed_data.space.id)
+            .order_by(TodoDAO.created_at.desc(), TodoDAO.id.desc())
+            .limit(10)
+        )
+        plan = await explain(lambda session: session.execute(statement))
+        assert "todo@ix_todo_space_id_created_at_id" in plan
+        assert "index join" not in plan
@@ -0,0 +1,56 @@
+import uuid
+
+import pytest
+from app.cache import USER_CHANNEL, get_user_cache, invalidate_on_commit
+from app.db import db_session
+from app.invalidation import TableInvalidationBus
+from app.models import UserDAO
+
+
+class Rollback(Exception):
+    pass
+
+
+@pytest.mark.asyncio
+class TestInvalidation:
+    async def test_update_invalidates_on_commit(self, tmp_user: UserDAO):
+        cache = get_user_cache()
+        cache.set(tmp_user.id, tmp_user)
+        async with db_session() as session:
+            user = await UserDAO.get(session, tmp_user.id)
+            user.update(name=f"{tmp_user.name}_renamed")
+            # Not evicted until the transaction commits
+            assert cache.get(tmp_user.id) is tmp_user
+        assert cache.get(tmp_user.id) is None
+
+    async def test_rollback_keeps_cache(self, tmp_user: UserDAO):
+        cache = get_user_cache()
+        cache.set(tmp_user.id, tmp_user)
+        with pytest.raises(Rollback):
+            async with db_session() as session:
+                await UserDAO.delete(session, tmp_user.id)
+                raise Rollback
+        assert cache.get(tmp_user.id) is tmp_user
+        cache.invalidate(tmp_user.id)
+
+    async def test_table_bus_delivers_committed_events(self):
+        "A second process' bus sees events committed through the table"
+        publisher = TableInvalidationBus()
+        subscriber = TableInvalidationBus()
+        received = []
+        subscriber.subscribe(USER_CHANNEL, received.append)
+        assert await subscriber.poll() == 0
+
+        committed, rolled_back = str(uuid.uuid4()), str(uuid.uuid4())
+        async with db_session() as session:
+            publisher.publish(session.sync_session, {(USER_CHANNEL, committed)})
+        with pytest.raises(Rollback):
+            async with db_session() as session:
+                publisher.publish(session.sync_session, {(USER_CHANNEL, rolled_back)})
+                await session.flush()
+                raise Rollback
+
+        assert await subscriber.poll() == 1
+        assert received == [committed]
+        # Events are only delivered once
+        assert await subscriber.poll() == 0
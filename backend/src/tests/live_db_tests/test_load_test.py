@@ -0,0 +1,15 @@
+import pytest
+from scripts.load_test import percentile
+
+
+class TestPercentile:
+    def test_nearest_rank(self):
+        ordered = [float(n) for n in range(1, 11)]
+        assert percentile(ordered, 50) == 5
+        assert percentile(ordered, 90) == 9
+        assert percentile(ordered, 95) == 10
+        assert percentile(ordered, 100) == 10
+
+    @pytest.mark.parametrize("pct", [0, 1, 50, 99, 100])
+    def test_single_value(self, pct: float):
+        assert percentile([3.0], pct) == 3.0
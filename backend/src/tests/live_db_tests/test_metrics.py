@@ -0,0 +1,31 @@
+import httpx
+import pytest
+from app.models import TodoDAO
+
+
+@pytest.mark.asyncio
+class TestMetrics:
+    @pytest.mark.usefixtures("auth_seed_user")
+    async def test_metrics(self, client: httpx.AsyncClient, tmp_todo: TodoDAO):
+        resp = await client.get(f"/todo/{tmp_todo.id}")
+        assert resp.status_code == 200
+
+        resp = await client.get("/metrics")
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("text/plain")
+        lines = resp.text.splitlines()
+        # Routes are labelled by their template, not the requested path
+        assert any(
+            line.startswith(
+                'http_requests_total{method="GET",route="/todo/{id}",status="200"}'
+            )
+            for line in lines
+        )
+        assert any(
+            line.startswith("http_request_duration_seconds_bucket") for line in lines
+        )
+        assert any(line.startswith('db_pool_size{engine="primary"}') for line in lines)
+        assert any(
+            line.startswith('db_statement_duration_seconds_count{statement="SELECT"}')
+            for line in lines
+        )
@@ -0,0 +1,65 @@
+import asyncio
+from typing import Iterator
+
+import httpx
+import pytest
+from app.db import get_engine
+from app.models import TodoDAO
+from app.slow_queries import SlowQueryLog
+from tests.conftest import SettingsOverride
+
+
+@pytest.fixture
+def slow_query_log() -> Iterator[SlowQueryLog]:
+    "A SlowQueryLog recording every statement run through the app engine"
+    log = SlowQueryLog()
+    log.configure(threshold_ms=0, maxlen=1000, explain=True)
+    engine = get_engine()
+    log.attach(engine)
+    yield log
+    log.detach(engine)
+
+
+@pytest.fixture
+def debug_routes(override_settings: SettingsOverride):
+    override_settings(DEBUG_ROUTES=True)
+
+
+@pytest.mark.asyncio
+class TestSlowQueries:
+    @pytest.mark.usefixtures("auth_seed_user")
+    async def test_records_route_and_plan(
+        self, client: httpx.AsyncClient, tmp_todo: TodoDAO, slow_query_log: SlowQueryLog
+    ):
+        endpoint = f"/todo/{tmp_todo.id}"
+        resp = await client.get(endpoint)
+        assert resp.status_code == 200
+
+        entries = [
+            e
+            for e in slow_query_log.entries
+            if e.route == f"GET {endpoint}" and "FROM todo " in e.statement
+        ]
+        assert len(entries) == 1
+        entry = entries[0]
+        # Parameter values (the todo id) are never kept
+        assert entry.parameter_count == 1
+        assert not hasattr(entry, "parameters")
+
+        # EXPLAIN runs in the background on its own connection
+        for _ in range(50):
+            if entry.plan is not None:
+                break
+            await asyncio.sleep(0.1)
+        assert entry.plan and "failed" not in entry.plan
+
+    @pytest.mark.usefixtures("auth_seed_user", "debug_routes")
+    async def test_debug_route(self, client: httpx.AsyncClient):
+        resp = await client.get("/debug/slow-queries")
+        assert resp.status_code == 200
+        assert isinstance(resp.json(), list)
+
+    @pytest.mark.usefixtures("auth_seed_user")
+    async def test_debug_route_off_by_default(self, client: httpx.AsyncClient):
+        resp = await client.get("/debug/slow-queries")
+        assert resp.status_code == 404